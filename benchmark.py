@@ -0,0 +1,182 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+
+from generate_scene import generate_scene, LAYOUTS
+from iosystem import open_scene, SceneStream
+from run_simulation import load_scene
+from world import World
+
+
+# phases a step is broken into (see world.PROFILE_HOOKS), integration is
+# what is left of the step
+PHASES = ('neighbors', 'social', 'desired', 'obstacle', 'integration', 'drawing')
+
+
+def _build(scene, mode, obstacles, draw, verlet_skin=None):
+    if draw:
+        # drawing to an offscreen surface unless told otherwise
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        from crowdsim import Simulation
+        world = Simulation(params=scene.get_parameters())
+    else:
+        world = World(params=scene.get_parameters())
+    return load_scene(world, scene, obstacles, batch=(mode == 'batch'), verlet_skin=verlet_skin)
+
+
+def _steps_per_rebuild(world):
+    """ How many steps the Verlet lists lasted on average, over every
+        step of the case
+    """
+    if world.agent_verlet is None:
+        return None
+    return world.step_count / float(max(1, world.agent_verlet.rebuilds))
+
+
+def run_case(scene, mode='batch', obstacles='exact', steps=20, warmup=2, draw=False, verlet_skin=None):
+    """ Benchmark stepping (and optionally drawing) a scene, returns a
+        dict of the results, phase times are in seconds per step.
+        verlet_skin turns on the Verlet neighbor lists (see
+        World.use_verlet_lists)
+    """
+    world = _build(scene, mode, obstacles, draw, verlet_skin)
+    # World.run, the viewer has its own main loop run
+    World.run(world, warmup)
+
+    # plain steps/sec first, without the timers in the way
+    start = time.time()
+    World.run(world, steps)
+    elapsed = time.time() - start
+
+    # then where the time goes, the profiler adds a little to every call
+    with world.profiler:
+        World.run(world, steps)
+    times = dict((phase, world.profiler.times[phase]) for phase in PHASES)
+    times['integration'] = max(0.0, world.profiler.times['step'] - sum(times.values()))
+
+    if draw:
+        start = time.time()
+        for _ in xrange(steps):
+            world.render()
+        times['drawing'] = time.time() - start
+
+    return dict(mode=mode,
+                obstacle_method=obstacles,
+                verlet_skin=verlet_skin,
+                steps_per_rebuild=_steps_per_rebuild(world),
+                agents=len(world.agents),
+                obstacles=len(world.obstacles),
+                steps=steps,
+                steps_per_sec=steps / elapsed if elapsed > 0 else float('inf'),
+                phases=dict((phase, times[phase] / steps) for phase in PHASES))
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       stderr=open(os.devnull, 'w')).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    """ Where the numbers come from """
+    return dict(revision=_git_revision(),
+                date=time.strftime('%Y-%m-%dT%H:%M:%S'),
+                python=platform.python_version(),
+                numpy=np.__version__,
+                machine=platform.machine(),
+                processor=platform.processor(),
+                system=platform.platform())
+
+
+def run_benchmarks(scenes=(), layouts=(), agent_counts=(100, 1000), modes=('sequential', 'batch'),
+                   obstacles='exact', steps=20, segment_lengths=(None,), draw=False, verlet_skin=None,
+                   log=None):
+    """ Run every (scene, mode) combination; scenes are shipped scene
+        files, layouts are generated (see generate_scene) for every agent
+        count and wall segment length (shorter segments, more obstacles).
+        Returns the results along with the environment
+    """
+    # what was run, so that the run can be repeated (see perf_gate.py)
+    config = dict(scenes=list(scenes), layouts=list(layouts), agent_counts=list(agent_counts),
+                  modes=list(modes), obstacles=obstacles, steps=steps,
+                  segment_lengths=list(segment_lengths), draw=draw, verlet_skin=verlet_skin)
+
+    cases = [(os.path.basename(filename), open_scene(filename)) for filename in scenes]
+
+    directory = tempfile.mkdtemp(prefix='crowdsim-bench-')
+    try:
+        for layout in layouts:
+            for agents in agent_counts:
+                for segment_length in segment_lengths:
+                    name = '%s-%d' % (layout, agents)
+                    if segment_length is not None:
+                        name += '-s%g' % segment_length
+                    filename = os.path.join(directory, name + '.xml')
+                    generate_scene(filename, layout, agents, segment_length=segment_length)
+                    cases.append((name, SceneStream(filename)))
+
+        results = []
+        for name, scene in cases:
+            for mode in modes:
+                result = run_case(scene, mode, obstacles, steps, draw=draw, verlet_skin=verlet_skin)
+                result['scene'] = name
+                results.append(result)
+                if log is not None:
+                    log(result)
+    finally:
+        shutil.rmtree(directory)
+
+    return dict(environment=environment(), config=config, results=results)
+
+
+def format_result(result):
+    phases = ' '.join('%s=%.2fms' % (phase, result['phases'][phase] * 1000) for phase in PHASES
+                      if result['phases'][phase] > 0)
+    line = '%-20s %-10s %7d agents %6d obstacles %9.1f steps/s  %s' % (
+        result['scene'], result['mode'], result['agents'], result['obstacles'], result['steps_per_sec'], phases)
+    if result.get('verlet_skin') is not None:
+        line += '  verlet skin=%gm, rebuilt every %.1f steps' % (result['verlet_skin'], result['steps_per_rebuild'])
+    return line
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the simulation step')
+    parser.add_argument('--scenes', nargs='*', default=['scenes/simple_room.xml', 'scenes/square_room.xml'],
+                        help='scene files to benchmark')
+    parser.add_argument('--layouts', nargs='*', choices=sorted(LAYOUTS), default=['rooms'],
+                        help='generated layouts to benchmark (see generate_scene.py)')
+    parser.add_argument('--agents', type=int, nargs='+', default=[100, 1000],
+                        help='agent counts of the generated scenes')
+    parser.add_argument('--segment-lengths', type=float, nargs='+', default=[None],
+                        help='wall segment lengths of the generated scenes in metres, for more obstacles')
+    parser.add_argument('--modes', nargs='+', choices=('sequential', 'batch'), default=['sequential', 'batch'],
+                        help='stepping modes to benchmark')
+    parser.add_argument('--obstacles', choices=('scan', 'field', 'exact', 'tree'), default='exact',
+                        help='obstacle force lookup')
+    parser.add_argument('--verlet-skin', type=float, default=None, metavar='METRES',
+                        help='use Verlet neighbor lists with this skin (see World.use_verlet_lists)')
+    parser.add_argument('--steps', type=int, default=20,
+                        help='number of steps to time per case')
+    parser.add_argument('--draw', action='store_true',
+                        help='also time drawing (offscreen unless SDL_VIDEODRIVER is set)')
+    parser.add_argument('--output', default=None,
+                        help='write the results as JSON to this file')
+    args = parser.parse_args()
+
+    def log(result):
+        print format_result(result)
+
+    report = run_benchmarks(args.scenes, args.layouts, args.agents, args.modes, args.obstacles,
+                            args.steps, args.segment_lengths, args.draw, args.verlet_skin, log)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
@@ -6,10 +6,35 @@ class Controller(object):
     
     __metaclass__ = ABCMeta
 
+    # whether drive_batch keeps per-agent state of its own from one step
+    # to the next, by row of the crowd state
+    batch_state = False
+
     @abstractmethod
     def drive_single_step(self, agent, delta_time):
         raise NotImplementedError('This method must be overriden')
 
+    def drive_batch(self, state, delta_time):
+        """ Drive the whole crowd (a physics.CrowdState) over a single
+            simulation step. Controllers without a vectorized version
+            fall back to driving the agents one after the other
+        """
+        state.store()
+        for agent in state.agents:
+            self.drive_single_step(agent, delta_time)
+        state.load()
+
+    def get_state(self):
+        """ The state the controller keeps from one step to the next,
+            as a dict of numpy arrays (see iosystem.save_checkpoint)
+        """
+        return dict()
+
+    def set_state(self, state):
+        """ Restore a state returned by get_state
+        """
+        pass
+
     @abstractmethod
     def info(self):
-        raise NotImplementedError('Abstract Class: please override this method')
\ No newline at end of file
+        raise NotImplementedError('Abstract Class: please override this method')
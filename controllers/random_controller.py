@@ -1,12 +1,17 @@
 from random import randint
 
+import numpy as np
+
 from controllers import Controller
 from utils import vec2d
 
 
 class RandomController(Controller):
     """A Random controller, which drives the agents anywhere in the scene"""
-    
+
+    # turn counters per row, see _change_directions
+    batch_state = True
+
     def __init__(self, environment):
         self.environment = environment
 
@@ -22,9 +27,26 @@ class RandomController(Controller):
         agent.position += displacement
 
 
+    def drive_batch(self, state, delta_time):
+        """ drive_batch
+        Drive the whole crowd over a single simulation step at once
+        """
+        self._change_directions(state, delta_time / 1000.0)
+        state.prev_positions[:] = state.positions
+        state.positions += state.directions * (state.vmax * delta_time)[:, None]
+
+
     def info(self):
         return 'Random Controller'
 
+    def get_state(self):
+        return dict(counter=np.array(self._counter, dtype=np.float64),
+                    counters=np.zeros(0) if self._counters is None else self._counters.copy())
+
+    def set_state(self, state):
+        self._counter = float(state['counter'])
+        self._counters = state['counters'].copy() if len(state['counters']) else None
+
 
     _counter = 0
     
@@ -39,4 +61,23 @@ class RandomController(Controller):
         self._counter += delta_time*2000.0
         if self._counter > (randint(50, 300) / 1000.0):
             agent._direction.rotate(45 * randint(-1, 1))
-            self._counter = 0
\ No newline at end of file
+            self._counter = 0
+
+
+    _counters = None
+
+    def _change_directions(self, state, delta_time):
+        """ Batch version of _change_direction, with a turn counter per
+            agent instead of one shared by all
+        """
+        if self._counters is None or len(self._counters) != len(state):
+            self._counters = np.zeros(len(state))
+
+        self._counters += delta_time*2000.0
+        turning = self._counters > np.random.randint(50, 301, len(state)) / 1000.0
+
+        angles = np.radians(45 * np.random.randint(-1, 2, turning.sum()))
+        cos, sin = np.cos(angles), np.sin(angles)
+        x, y = state.directions[turning, 0], state.directions[turning, 1]
+        state.directions[turning] = np.column_stack((x*cos - y*sin, x*sin + y*cos))
+        self._counters[turning] = 0
\ No newline at end of file
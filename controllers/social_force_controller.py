@@ -1,7 +1,11 @@
+import numpy as np
+
 from controllers import Controller
 # from pygame.math import Vectr3
 from utils import vec2d
 from utils import SF_FACTORS
+from physics import pairwise_social_forces, advance_waypoints, desired_forces, \
+                    obstacle_forces, field_obstacle_forces
 
 
 class SocialForceController(Controller):
@@ -17,6 +21,9 @@ class SocialForceController(Controller):
         """
         self.environment = environment
 
+        # weights of the forces, may be changed per controller
+        self.factors = SF_FACTORS
+
 
     def drive_single_step(self, agent, delta_time):
         """ drive_single_step
@@ -28,11 +35,12 @@ class SocialForceController(Controller):
         # print agent.social_force, agent.desired_force, agent.obstacle_force
 
         # sum up all the forces
+        factors = self.factors
         forces = vec2d(0, 0)
-        forces.x = SF_FACTORS.social * agent.social_force[0] + SF_FACTORS.obstacle * agent.obstacle_force[0] + \
-                    SF_FACTORS.desired * agent.desired_force[0] + SF_FACTORS.lookahead * agent.lookahead_force[0]
-        forces.y = SF_FACTORS.social * agent.social_force[1] + SF_FACTORS.obstacle * agent.obstacle_force[1] + \
-                    SF_FACTORS.desired * agent.desired_force[1] + SF_FACTORS.lookahead * agent.lookahead_force[1]
+        forces.x = factors.social * agent.social_force[0] + factors.obstacle * agent.obstacle_force[0] + \
+                    factors.desired * agent.desired_force[0] + factors.lookahead * agent.lookahead_force[0]
+        forces.y = factors.social * agent.social_force[1] + factors.obstacle * agent.obstacle_force[1] + \
+                    factors.desired * agent.desired_force[1] + factors.lookahead * agent.lookahead_force[1]
 
         # calculate the velocity based on the acceleration (forces) and momentum
         agent._velocity.x += delta_time * forces.x
@@ -40,8 +48,9 @@ class SocialForceController(Controller):
 
         # check is resulting speed is beyond maximum speed
         if agent._velocity.get_length() > agent._vmax:
-            agent._velocity.x = (agent._velocity.normalized().x) * agent._vmax
-            agent._velocity.y = (agent._velocity.normalized().y) * agent._vmax
+            direction = agent._velocity.normalized()
+            agent._velocity.x = direction.x * agent._vmax
+            agent._velocity.y = direction.y * agent._vmax
 
         # update positions and velocities
         displacement = agent._velocity * delta_time
@@ -50,5 +59,65 @@ class SocialForceController(Controller):
 
 
 
+    def drive_batch(self, state, delta_time):
+        """ drive_batch
+        Drive the whole crowd over a single simulation step at once.
+        Unlike drive_single_step, all agents see the positions of the
+        others from the start of the step
+        """
+        i, j = self.environment.agent_neighbor_pairs(state.positions)
+        state.social_force[:] = pairwise_social_forces(state.positions, state.velocities, i, j)
+
+        advance_waypoints(state)
+        state.desired_force[:] = desired_forces(state)
+        state.obstacle_force[:] = self._obstacle_forces(state)
+        state.lookahead_force[:] = 0.0
+
+        # sum up all the forces
+        factors = self.factors
+        forces = factors.social * state.social_force + factors.obstacle * state.obstacle_force + \
+                    factors.desired * state.desired_force + factors.lookahead * state.lookahead_force
+
+        # calculate the velocity based on the acceleration (forces) and momentum
+        state.velocities += delta_time * forces
+
+        # clip resulting speeds beyond maximum speed
+        speed = np.sqrt(state.velocities[:, 0]**2 + state.velocities[:, 1]**2)
+        too_fast = speed > state.vmax
+        state.velocities[too_fast] *= (state.vmax[too_fast] / speed[too_fast])[:, None]
+
+        # update positions and velocities
+        state.prev_positions[:] = state.positions
+        state.positions += state.velocities * delta_time
+
+    def _obstacle_forces(self, state):
+        environment = self.environment
+        if len(environment.obstacles) == 0:
+            return np.zeros((len(state), 2))
+
+        # one lookup per agent, or per agent and obstacle when scanning
+        stats = environment.step_stats
+        if environment.obstacle_field is not None or environment.obstacle_geometry is not None:
+            stats['obstacle_queries'] += len(state)
+        else:
+            stats['obstacle_queries'] += len(state) * len(environment.obstacles)
+
+        if environment.obstacle_field is not None:
+            distances, away = environment.obstacle_field.sample(state.positions)
+            return field_obstacle_forces(state.radius, distances, away)
+
+        if environment.obstacle_geometry is not None:
+            distances, closest, _ = environment.obstacle_geometry.closest_points(state.positions)
+        else:
+            # obstacles were not compiled, scan them like the agents do
+            found = [min((obstacle.point_distance(position) for obstacle in environment.obstacles),
+                         key=lambda candidate: candidate[0])
+                     for position in state.positions.tolist()]
+            distances = np.array([dist for dist, _ in found])
+            closest = np.array([point for _, point in found]).reshape(-1, 2)
+
+        return obstacle_forces(state.positions, state.radius, distances, closest)
+
+
     def info(self):
         return 'Social Force Controller'
\ No newline at end of file
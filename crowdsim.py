@@ -1,71 +1,83 @@
 import os, sys
-from random import randint, choice, normalvariate
-from math import sin, cos, radians
 
 import pygame
 from pygame import Rect
 from pygame.locals import *
 
-from entities import Agent, Waypoint, Obstacle
-from utils import Timer, Box, GridMap, SIM_COLORS, SCALE, random_position, random_fatness
-from controllers import SocialForceController, RandomController
+from entities import Agent
+from utils import FixedStepScheduler, SIM_COLORS, SCALE
+from utils.widgets import Box
+from world import World
 
 
-class Simulation(object):
+class Simulation(World):
     """ 
-    The main simulation entry point 
+    The main simulation entry point. A pygame viewer on top of the
+    headless World
     """
 
     # basic defaults
     SCREEN_WIDTH, SCREEN_HEIGHT = 700, 700
-    GRID_SIZE = 20, 20
-    FIELD_SIZE = 500, 500
-    FIELD_LIMITS = 0, 0, 600, 600
     field_bgcolor = SIM_COLORS['white']
 
-    def __init__(self, params=None):
+    def __init__(self, params=None, render_every=1, max_fps=60, speed=10.0):
+        """ Create the viewer
+
+            params:
+                scene parameters (see SceneIO.get_parameters)
+            render_every:
+                draw at most once every render_every simulation steps
+            max_fps:
+                draw at most max_fps times per second of wall time
+                (None for no limit)
+            speed:
+                real time multiplier, simulated seconds per second of
+                wall time (None to simulate as fast as possible)
+        """
         pygame.init()
+        World.__init__(self, params)
+
+        # the whole update and drawing are profiled too
+        self.profiler.hooks[:0] = [('update', Simulation, 'simulation_update'),
+                                   ('render', Simulation, 'render')]
+        # and every part of a frame shows on the timeline
+        self.tracer.hooks[:0] = [('frame', Simulation, '_frame'),
+                                 ('events', Simulation, '_process_events'),
+                                 ('timer', FixedStepScheduler, 'update'),
+                                 ('draw', Simulation, 'draw'),
+                                 ('flip', pygame.display, 'flip')]
 
         if params is not None:
             self.SCREEN_HEIGHT, self.SCREEN_WIDTH = int(float(params['display']['height']) * SCALE), \
                                                     int(float(params['display']['width']) * SCALE)
-            self.FIELD_LIMITS = int(float(params['field_top_left_x']) * SCALE), \
-                                int(float(params['field_top_left_y']) * SCALE), \
-                                int(float(params['field_bottom_right_x']) * SCALE), \
-                                int(float(params['field_bottom_right_y']) * SCALE)
-            self.FIELD_SIZE = self.FIELD_LIMITS[2] - self.FIELD_LIMITS[0], self.FIELD_LIMITS[3] - self.FIELD_LIMITS[1]
-            self.GRID_SIZE = int(float(params['cell']['width']) * SCALE), int(float(params['cell']['height']) * SCALE)
 
         # zoom and centering
         self.offset = 0, 0
-        self.zoom_factor = 1.0
         self._old_screen = self.SCREEN_WIDTH, self.SCREEN_HEIGHT
 
         # setup the screen and the box field of play
         self.initialize_screen()
 
         # agents
-        self.agents = pygame.sprite.Group()
         self.agent_image = pygame.image.load('assets/blueagent.bmp').convert_alpha()
-        self.controller = SocialForceController(self)
-        # self.controller = RandomController(self)
 
         # time related items
         self.clock = pygame.time.Clock()
         self.paused = False
-        self.simulation_timer = Timer(10, self.simulation_update)
+        # looked up on every step, so profiling hooks on simulation_update apply
+        self.scheduler = FixedStepScheduler(self.STEP_SIZE, lambda: self.simulation_update(), speed=speed)
+        # speed to go back to when leaving maximum speed (see _process_key)
+        self._paced_speed = speed if speed is not None else 1.0
 
-        # create the grid
-        self.setup_grid()
+        # rendering runs at its own rate, independent of the simulation
+        self.render_every = render_every
+        self.max_fps = max_fps
+        self._steps_since_render = 0
+        self._time_since_render = 0
 
         # additional options (remove this)
         self.options = dict(draw_grid=True)
 
-        # setup objects (waypoints, obstacles)
-        self.waypoints = dict()
-        self.obstacles = []
-        self._agent_count = 0
-
         # initialize the time
         self.time_passed = 0
 
@@ -85,20 +97,6 @@ class Simulation(object):
 
         self.field_rect = self.field_box.get_internal_rect()
 
-    def setup_grid(self):
-        self.grid_nrows = self.FIELD_SIZE[1] / int(self.GRID_SIZE[0]*self.zoom_factor)
-        self.grid_ncols = self.FIELD_SIZE[0] / int(self.GRID_SIZE[1]*self.zoom_factor)
-
-    def get_agent_neighbors(self, agent, dist_range):
-        neighbors = []
-        for other in self.agents:
-            if not agent.id == other.id:
-                dist = agent.position.get_distance(other.position)
-                if dist <= dist_range:
-                    neighbors.append(other)
-
-        return neighbors
-
     def draw_grid(self):
         for y in range(self.grid_nrows + 1):
             pygame.draw.line(
@@ -114,25 +112,11 @@ class Simulation(object):
                 (self.field_rect.left + x * int(self.GRID_SIZE[0]*self.zoom_factor) - 1, self.field_rect.top),
                 (self.field_rect.left + x * int(self.GRID_SIZE[0]*self.zoom_factor) - 1, self.field_rect.bottom - 1))
 
-    def xy2coord(self, pos):
-        """ Convert a (x, y) pair to a (nrow, ncol) coordinate
-        """
-        x, y = (pos[0] - self.field_rect.left, pos[1] - self.field_rect.top)
-        return int(y) / self.GRID_SIZE[1], int(x) / self.GRID_SIZE[0]
-    
-    def coord2xy_mid(self, coord):
-        """ Convert a (nrow, ncol) coordinate to a (x, y) pair,
-            where x,y is the middle of the square at the coord
-        """
-        nrow, ncol = coord
-        return (
-            self.field_rect.left + ncol * self.GRID_SIZE[0] + self.GRID_SIZE[0] / 2,
-            self.field_rect.top + nrow * self.GRID_SIZE[1] + self.GRID_SIZE[1] / 2)
-
     def draw_background(self):
         pygame.draw.rect(self.screen, SIM_COLORS['light gray'], [0, 0, self.SCREEN_WIDTH, self.SCREEN_HEIGHT])
 
     def draw(self):
+        self.sync_agents()
         self.draw_background()
         self.field_box.draw()
         
@@ -150,7 +134,7 @@ class Simulation(object):
 
     def demo_populate_scene(self):
         # agents
-        self.agents.add(
+        self.agents.append(
                 Agent(  agent_id = 0,
                     screen = self.screen,
                     game = self,
@@ -162,7 +146,7 @@ class Simulation(object):
                     waypoints = [self.waypoints['stop'], self.waypoints['start']]
                     )
             )
-        self.agents.add(
+        self.agents.append(
                 Agent(  agent_id = 1,
                     screen = self.screen,
                     game = self,
@@ -175,7 +159,7 @@ class Simulation(object):
                     )
             )
 
-        self.agents.add(
+        self.agents.append(
                 Agent(  agent_id = 2,
                     screen = self.screen,
                     game = self,
@@ -189,30 +173,32 @@ class Simulation(object):
             )
 
     def simulation_update(self):
-        for agent in self.agents:
-            agent.update(0.1)
-            self.controller.drive_single_step(agent, delta_time=0.1)
-            agent.draw()
+        self.step(self.STEP_SIZE)
+        self._steps_since_render += 1
+
+    def render_due(self):
+        """ Whether a frame should be drawn now, given the render rate
+            limits (while paused only the frame rate limit applies)
+        """
+        if self.max_fps and self._time_since_render < 1000.0 / self.max_fps:
+            return False
+        return self.paused or self._steps_since_render >= self.render_every
+
+    def render(self):
         self.draw()
 
+        # update the game surface
+        pygame.display.flip()
+
+        self._steps_since_render = 0
+        self._time_since_render = 0
+
     def _process_events(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 self.quit()
             elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_SPACE:
-                    self.paused = not self.paused
-                elif event.key == pygame.K_g:
-                    if pygame.key.get_mods() & pygame.KMOD_CTRL:
-                        self.options['draw_grid'] = not self.options['draw_grid']
-                elif event.key == pygame.K_PLUS or event.key == pygame.K_EQUALS:
-                    #self.zoom_factor += 0.1
-                    self.initialize_screen()
-                    self.setup_grid()
-                elif event.key == pygame.K_MINUS:
-                    #self.zoom_factor -= 0.1
-                    self.initialize_screen()
-                    self.setup_grid()
+                self._process_key(event.key)
             elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
                 pass
             elif event.type == VIDEORESIZE:
@@ -230,6 +216,39 @@ class Simulation(object):
                 self.initialize_screen()
                 self.setup_grid()
 
+    def _process_key(self, key):
+        if key == pygame.K_SPACE:
+            self.paused = not self.paused
+        elif key == pygame.K_RIGHTBRACKET:
+            if self.scheduler.speed is not None:
+                self.scheduler.speed *= 2
+        elif key == pygame.K_LEFTBRACKET:
+            if self.scheduler.speed is not None:
+                self.scheduler.speed /= 2
+        elif key == pygame.K_0:
+            # toggle between maximum and the speed it was running at
+            if self.scheduler.speed is None:
+                self.scheduler.speed = self._paced_speed
+            else:
+                self._paced_speed = self.scheduler.speed
+                self.scheduler.speed = None
+            self.scheduler.accumulator = 0.0
+        elif key == pygame.K_g:
+            if pygame.key.get_mods() & pygame.KMOD_CTRL:
+                self.options['draw_grid'] = not self.options['draw_grid']
+        elif key == pygame.K_p:
+            # profile the steps until p is pressed again, then show where the time went
+            if not self.profiler.toggle():
+                print self.profiler.format_table()
+        elif key == pygame.K_PLUS or key == pygame.K_EQUALS:
+            #self.zoom_factor += 0.1
+            self.initialize_screen()
+            self.setup_grid()
+        elif key == pygame.K_MINUS:
+            #self.zoom_factor -= 0.1
+            self.initialize_screen()
+            self.setup_grid()
+
     _total_time = 0
 
     def run(self):
@@ -242,67 +261,47 @@ class Simulation(object):
             # self._total_time += self.time_passed
             # if self._total_time < 1000:
             #     continue
-            
-            # handle any events
-            self._process_events()
-            
-            if not self.paused:     
-                self.simulation_timer.update(self.time_passed)
-            
-            # update the game surface
-            pygame.display.flip()
-
-    def add_agents(self, agent_dict):
-        for agent in agent_dict:
-            dx, dy = float(agent['dx']), float(agent['dy'])
-            x, y = float(agent['x']), float(agent['y'])
-            num = int(agent['n'])
-            a_type = int(agent['type'])
-
-            # spawn an agent in a random direction and position(within dx, dy)
-            direction = (randint(-1, 1), randint(-1, 1))
-            position = random_position(x, y, dx, dy)
-            waypoints = [awp['id'] for awp in agent['addwaypoint']]
-
-            rd = 0.3
-
-            for _ in xrange(num):
-                self.agents.add(Agent(
-                        agent_id = self._agent_count,
-                        atype = a_type,
-                        screen = self.screen,
-                        game = self,
-                        agent_image = self.agent_image,
-                        field = self.field_rect,
-                        init_position = position,
-                        init_direction = direction,
-                        max_speed = normalvariate(1.34, 0.26),
-                        radius = rd,
-                        waypoints = [self.waypoints[wp] for wp in waypoints]
-                    ))
-                self._agent_count += 1
-
-        # we are done here
-        # TODO - move the velocity stuff to a neat function
-        # TODO - find a suitable fatness distribution
-    
-    def add_waypoints(self, waypoint_dict):
-        for waypoint in waypoint_dict:
-            w_id = waypoint['id']
-            radius = float(waypoint['radius'])
-            wtype = waypoint['type']
-            x, y = float(waypoint['x']), float(waypoint['y'])
-            self.waypoints.update({w_id : Waypoint(screen=self.screen, wid=w_id, wtype=wtype, position=(x, y), radius=radius)})
-
-    def add_obstacles(self, obstacle_dict):
-        for obstacle in obstacle_dict:
-            o_id = obstacle['id']
-            p1 = float(obstacle['p1'])
-            p2 = float(obstacle['p2'])
-            p3 = float(obstacle['p3'])
-            p4 = float(obstacle['p4'])
-            o_type = obstacle['type'].title()
-            self.obstacles.append(Obstacle(screen=self.screen, oid=o_id, otype=o_type, params=(p1, p2, p3, p4)))
+
+            self._frame()
+            self._idle()
+
+    def _frame(self):
+        # handle any events
+        self._process_events()
+
+        if not self.paused:
+            self.scheduler.update(self.time_passed)
+
+        self._time_since_render += self.time_passed
+        if self.render_due():
+            self.render()
+
+    def _idle(self):
+        """ Sleep until the next simulation step or frame is due, rather
+            than spinning the loop
+        """
+        waits = []
+        if not self.paused:
+            until_step = self.scheduler.time_until_next_step()
+            if until_step is None:
+                return
+            waits.append(until_step)
+        # a frame only matters once it has something new to show
+        if self.paused or self._steps_since_render >= self.render_every:
+            if self.max_fps:
+                waits.append(1000.0 / self.max_fps - self._time_since_render)
+            elif self.paused:
+                waits.append(10)
+
+        wait = int(min(waits))
+        if wait > 0:
+            pygame.time.wait(wait)
 
     def quit(self):
+        self.stop_recording()
+        self.stop_tracing()
+        self.stop_monitoring()
+        if self.profiler.enabled:
+            self.profiler.disable()
+            print self.profiler.format_table()
         sys.exit()
@@ -0,0 +1,298 @@
+import argparse
+import csv
+import itertools
+import multiprocessing
+import random
+
+import numpy as np
+
+from controllers import SocialForceController
+from iosystem import open_scene
+from physics import CrowdState
+from spatial import SpatialHash
+from utils import SF_FACTORS, ForceFactor, NEIGHBOR_RADIUS, SCALE, STEP_STATS
+from world import World
+
+
+# columns of the summary table
+COLUMNS = ('seed', 'social', 'obstacle', 'desired', 'lookahead', 'speed_mean', 'speed_sd',
+           'agents', 'evacuation_time', 'mean_speed', 'waypoint_completions', 'finished')
+
+
+def scene_dict(sio):
+    """ The parts of a SceneIO scene a World is built from, as plain
+        (picklable) dicts so they can be sent to worker processes
+    """
+    return dict(parameters=sio.get_parameters(),
+                waypoints=sio.get_waypoints(),
+                obstacles=sio.get_obstacles(),
+                agents=sio.get_agents())
+
+
+def parameter_grid(seeds=(0,), factors=(SF_FACTORS,), speeds=(World.SPEED_DISTRIBUTION,)):
+    """ One replica for every combination of a random seed, social
+        force factors (ForceFactor) and a (mean, sd) distribution of the
+        agents' maximum speeds
+    """
+    return [dict(seed=seed, factors=ForceFactor(*factor), speed=tuple(speed))
+            for factor, speed, seed in itertools.product(factors, speeds, seeds)]
+
+
+def build_world(scene, replica, obstacles='exact'):
+    """ A World of the scene (see scene_dict) in batch mode, its agents
+        spawned with the replica's seed and speed distribution and its
+        controller using the replica's force factors
+    """
+    # agents are spawned with both random modules (see World.add_agents,
+    # RandomController)
+    random.seed(replica['seed'])
+    np.random.seed(replica['seed'])
+
+    world = World(params=scene['parameters'])
+    world.SPEED_DISTRIBUTION = replica['speed']
+    world.controller.factors = replica['factors']
+    world.add_waypoints(waypoint_dict=scene['waypoints'])
+    world.add_obstacles(obstacle_dict=scene['obstacles'])
+    world.add_agents(agent_dict=scene['agents'])
+    if obstacles != 'scan':
+        world.compile_obstacles(method=obstacles)
+    world.use_batch_mode()
+    return world
+
+
+class ReplicaBatch(object):
+    """ K independent replicas of a scene simulated in a single set of
+        arrays, so that one vectorized step (SocialForceController
+        .drive_batch) advances all of them. The rows of replica k are
+        k * size ... (k + 1) * size - 1 of the crowd state; per_replica()
+        gives the arrays with an explicit replica dimension.
+
+        Every replica spawns its agents with its own seed, speed
+        distribution and force factors. Stepping itself draws no random
+        numbers. The replicas share the obstacles, which are compiled
+        once. For the neighbor search each replica is shifted sideways by
+        a field width and more, so replicas never see each other's
+        agents.
+
+        While stepping, the summary metrics of every replica are
+        gathered (see summary).
+    """
+    def __init__(self, scene, replicas, obstacles='exact'):
+        """
+            scene:
+                the scene as plain dicts (see scene_dict)
+            replicas:
+                the replicas' parameters (see parameter_grid)
+            obstacles:
+                obstacle force lookup, as in run_simulation.py
+        """
+        self.replicas = list(replicas)
+        self.worlds = [build_world(scene, replica, obstacles if k == 0 else 'scan')
+                       for k, replica in enumerate(self.replicas)]
+        self.world = self.worlds[0]
+        self.size = len(self.world.agents)
+
+        self.crowd = CrowdState.stack([world.crowd_state() for world in self.worlds])
+        self.controller = SocialForceController(self)
+        self.controller.factors = ForceFactor(*[np.repeat(values, self.size)[:, None]
+                                                for values in zip(*[replica['factors']
+                                                                    for replica in self.replicas])])
+
+        # offset of every row for the neighbor search
+        rect = self.world.field_rect
+        stride = (rect.right - rect.left) / SCALE + 2 * NEIGHBOR_RADIUS
+        self._offsets = np.zeros((len(self.crowd), 2))
+        self._offsets[:, 0] = np.repeat(np.arange(len(self.replicas)) * stride, self.size)
+        self.agent_index = SpatialHash(self.world.agent_index.cell_size, self.world.agent_index.origin)
+
+        self.sim_time = 0.0
+        self.step_count = 0
+        # counts of the work done by the last step (see World.step_stats)
+        self.step_stats = dict.fromkeys(STEP_STATS, 0)
+        self.evacuation_time = [None] * len(self.replicas)
+        self._speed_sum = np.zeros(len(self.replicas))
+
+    # the environment the controller sees, obstacles are shared
+    @property
+    def obstacles(self):
+        return self.world.obstacles
+
+    @property
+    def obstacle_field(self):
+        return self.world.obstacle_field
+
+    @property
+    def obstacle_geometry(self):
+        return self.world.obstacle_geometry
+
+    def agent_neighbor_pairs(self, positions, radius=NEIGHBOR_RADIUS):
+        """ Same as World.agent_neighbor_pairs, pairs never cross replicas
+        """
+        self.agent_index.build(positions + self._offsets)
+        pairs = self.agent_index.neighbor_pairs(radius)
+
+        stats = self.step_stats
+        stats['neighbors_examined'] += self.agent_index.pairs_examined
+        stats['neighbors_found'] += len(pairs[0])
+        if len(pairs[0]):
+            stats['max_neighbors'] = max(stats['max_neighbors'], int(np.bincount(pairs[0]).max()))
+        return pairs
+
+    def per_replica(self, name):
+        """ The named array of the crowd state (eg. 'positions') viewed as
+            (replicas, agents, ...)
+        """
+        values = getattr(self.crowd, name)
+        return values.reshape((len(self.replicas), self.size) + values.shape[1:])
+
+    def step(self, dt=None):
+        """ Advance all replicas by a single simulation step of dt seconds
+        """
+        if dt is None:
+            dt = self.world.STEP_SIZE
+        for name in self.step_stats:
+            self.step_stats[name] = 0
+
+        self.crowd.confine(self.world.field_rect)
+        self.controller.drive_batch(self.crowd, dt)
+        self.sim_time += dt
+        self.step_count += 1
+
+        if self.size == 0:
+            return
+
+        velocities = self.per_replica('velocities')
+        self._speed_sum += np.sqrt(velocities[:, :, 0]**2 + velocities[:, :, 1]**2).mean(axis=1)
+        done = (self.per_replica('waypoints_reached') >= self.per_replica('route_lengths')).all(axis=1)
+        for k in np.nonzero(done)[0]:
+            if self.evacuation_time[k] is None:
+                self.evacuation_time[k] = self.sim_time
+
+    def run(self, n_steps, dt=None):
+        for _ in xrange(n_steps):
+            self.step(dt)
+
+    def sync_agents(self):
+        """ Copy the arrays back into the Agent entities of every replica
+        """
+        self.crowd.store()
+
+    def summary(self):
+        """ Summary of every replica, one dict each (see COLUMNS):
+
+                evacuation_time:
+                    simulated time at which every agent had been through
+                    its whole route (None if that has not happened yet)
+                mean_speed:
+                    speed of the agents averaged over agents and steps
+                waypoint_completions:
+                    number of waypoints reached, summed over the agents
+                finished:
+                    number of agents that went through their whole route
+        """
+        reached = self.per_replica('waypoints_reached')
+        finished = reached >= self.per_replica('route_lengths')
+
+        results = []
+        for k, replica in enumerate(self.replicas):
+            result = dict(replica['factors']._asdict())
+            result.update(seed=replica['seed'],
+                          speed_mean=replica['speed'][0],
+                          speed_sd=replica['speed'][1],
+                          agents=self.size,
+                          evacuation_time=self.evacuation_time[k],
+                          mean_speed=self._speed_sum[k] / self.step_count if self.step_count else 0.0,
+                          waypoint_completions=int(reached[k].sum()),
+                          finished=int(finished[k].sum()))
+            results.append(result)
+        return results
+
+
+def run_batch(scene, replicas, n_steps, obstacles='exact', dt=None):
+    """ Run the replicas of the scene together (see ReplicaBatch) for
+        n_steps, returns their summaries
+    """
+    batch = ReplicaBatch(scene, replicas, obstacles)
+    batch.run(n_steps, dt)
+    return batch.summary()
+
+
+def _run_task(task):
+    return run_batch(*task)
+
+
+def run_ensemble(sio, grid, n_steps, obstacles='exact', processes=None, batch_size=1, dt=None):
+    """ Run every replica of the grid (see parameter_grid) on the scene
+        of the SceneIO over a pool of worker processes, batch_size
+        replicas at a time per worker (see ReplicaBatch). Returns their
+        summaries in grid order
+    """
+    scene = scene_dict(sio)
+    tasks = [(scene, grid[k:k + batch_size], n_steps, obstacles, dt)
+             for k in xrange(0, len(grid), batch_size)]
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        return [result for results in pool.map(_run_task, tasks) for result in results]
+    finally:
+        pool.close()
+        pool.join()
+
+
+def format_table(results):
+    """ The summaries as a plain text table, one replica per line
+    """
+    def cell(value):
+        if value is None:
+            return '-'
+        if isinstance(value, float):
+            return '%.3f' % value
+        return str(value)
+
+    rows = [COLUMNS] + [tuple(cell(result[column]) for column in COLUMNS) for result in results]
+    widths = [max(len(row[k]) for row in rows) for k in xrange(len(COLUMNS))]
+    return '\n'.join('  '.join(value.rjust(width) for value, width in zip(row, widths)) for row in rows)
+
+
+def write_csv(results, filename):
+    with open(filename, 'wb') as f:
+        writer = csv.DictWriter(f, COLUMNS)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run many headless replicas of a scene over a '
+                                                 'grid of parameters')
+    parser.add_argument('scene', nargs='?', default='scenes/square_room.xml',
+                        help='scene file to load')
+    parser.add_argument('--steps', type=int, default=1000,
+                        help='number of steps to simulate per replica')
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0],
+                        help='random seeds of the replicas')
+    for name in ForceFactor._fields:
+        parser.add_argument('--%s' % name, type=float, nargs='+', default=[getattr(SF_FACTORS, name)],
+                            help='%s force factor(s)' % name)
+    parser.add_argument('--speed-mean', type=float, nargs='+', default=[World.SPEED_DISTRIBUTION[0]],
+                        help='mean(s) of the agents\' maximum speed (m/s)')
+    parser.add_argument('--speed-sd', type=float, nargs='+', default=[World.SPEED_DISTRIBUTION[1]],
+                        help='standard deviation(s) of the agents\' maximum speed (m/s)')
+    parser.add_argument('--obstacles', choices=('scan', 'field', 'exact', 'tree'), default='exact',
+                        help='obstacle force lookup (see run_simulation.py)')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='number of worker processes (one per core by default)')
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help='number of replicas simulated together in the same arrays')
+    parser.add_argument('--output', default=None,
+                        help='also write the table to this CSV file')
+    args = parser.parse_args()
+
+    factors = itertools.product(*[getattr(args, name) for name in ForceFactor._fields])
+    speeds = itertools.product(args.speed_mean, args.speed_sd)
+    grid = parameter_grid(args.seeds, list(factors), list(speeds))
+
+    results = run_ensemble(open_scene(args.scene), grid, args.steps, args.obstacles, args.processes,
+                           args.batch_size)
+    print format_table(results)
+    if args.output is not None:
+        write_csv(results, args.output)
@@ -2,14 +2,12 @@
 from random import randint, choice
 from math import sin, cos, radians, exp, sqrt, fabs
 
-import pygame
-from pygame.sprite import Sprite
 # from pygame.math import vec2d
-from utils import SIM_COLORS, SCALE, SIGN
+from utils import SIM_COLORS, SCALE, SIGN, NEIGHBOR_RADIUS
 from utils import euclidean_distance, vec2d, Rotate2D
 import numpy as np
 
-class Agent(Sprite):
+class Agent(object):
     """ A agent sprite that bounces off walls and changes its
         direction from time to time.
     """
@@ -26,7 +24,8 @@ class Agent(Sprite):
         
             screen: 
                 The screen on which the agent lives (must be a 
-                pygame Surface object, such as pygame.display)
+                pygame Surface object, such as pygame.display).
+                None when running headless
             
             game:
                 The game object that holds information about the
@@ -55,8 +54,6 @@ class Agent(Sprite):
             waypoints:
                 a list of waypoints for the agent to follow
         """
-        Sprite.__init__(self)
-        
         self._id  = agent_id
         self.screen = screen
         self.game = game
@@ -95,6 +92,8 @@ class Agent(Sprite):
         """ 
         Draw the agent onto the screen that is set in the constructor
         """
+        import pygame
+
         x, y = int(self._position.x*SCALE), int(self._position.y*SCALE)
         r = int(self._radius*SCALE)
         # poly = [(x-r/2, y), (x, y-40), (x+r/2, y), (x, y+r/2)]
@@ -120,6 +119,8 @@ class Agent(Sprite):
 
 
     def draw_forces(self):
+        import pygame
+
         # desired force
         pygame.draw.line(self.screen, SIM_COLORS['red'],
                 ((self._position.x*SCALE), (self._position.y*SCALE)),
@@ -156,7 +157,7 @@ class Agent(Sprite):
         # When the image is rotated, its size is changed.
         # self._image_w, self._image_h = self._image.get_size()
         # bounds_rect = self.screen.get_rect().inflate(-self._image_w, -self._image_h)
-        bounds_rect = self.game.field_box.get_internal_rect()
+        bounds_rect = self.game.field_rect
         self._direction = vec2d(self._velocity.x, -self._velocity.y)
         
         if self._position.x*SCALE < bounds_rect.left:
@@ -173,8 +174,9 @@ class Agent(Sprite):
             self._direction.y *= -1
 
     def social_move(self, time_passed):
-        # force is computed over neighbors with 0.5m radius (= 0.5*100 px)
-        self._neighbors = self.game.get_agent_neighbors(self, (0.5*SCALE))
+        # force is computed over neighbors within NEIGHBOR_RADIUS (0.5m),
+        # positions are in metres so the radius must not be scaled to px
+        self._neighbors = self.game.get_agent_neighbors(self, NEIGHBOR_RADIUS)
 
         # compute the forces
         self._social_force = self._compute_social_force()
@@ -229,6 +231,10 @@ class Agent(Sprite):
     def vmax(self):
         return self._vmax
 
+    @property
+    def radius(self):
+        return self._radius
+
     @property
     def relaxation_time(self):
         return self._relaxation_time
@@ -306,17 +312,36 @@ class Agent(Sprite):
     def _compute_obstacle_force(self):
         obstacle_force = vec2d(0.0, 0.0)
 
+        # compiled scenes answer with a lookup in the obstacle distance field
+        if self.game.obstacle_field is not None:
+            self.game.step_stats['obstacle_queries'] += 1
+            closest_distance, away = self.game.obstacle_field.lookup(self._position)
+            if closest_distance > self._radius*5:
+                return obstacle_force
+
+            force_amount = exp(-(closest_distance - self._radius))
+            obstacle_force.x = force_amount * away[0]
+            obstacle_force.y = force_amount * away[1]
+
+            return obstacle_force
+
         # if there are no obstacles, there is no obstacle force
         if len(self.game.obstacles) == 0:
             return obstacle_force
 
         # find the closest obstacle and the closest point on it
-        closest_distance, closest_point = self.game.obstacles[0].agent_distance(self)
-        for obstacle in self.game.obstacles:
-            other_distance, other_point = obstacle.agent_distance(self)
-
-            if other_distance < closest_distance:
-                closest_distance, closest_point = other_distance, other_point
+        if self.game.obstacle_geometry is not None:
+            self.game.step_stats['obstacle_queries'] += 1
+            closest_distance, closest_point = self.game.obstacle_geometry.closest(self._position, self._radius*5)
+        else:
+            # every obstacle, the first one twice
+            self.game.step_stats['obstacle_queries'] += len(self.game.obstacles) + 1
+            closest_distance, closest_point = self.game.obstacles[0].agent_distance(self)
+            for obstacle in self.game.obstacles:
+                other_distance, other_point = obstacle.agent_distance(self)
+
+                if other_distance < closest_distance:
+                    closest_distance, closest_point = other_distance, other_point
         
 
         distance = closest_distance - self._radius
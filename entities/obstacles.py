@@ -1,6 +1,5 @@
 # obstacles for the scene
 
-import pygame
 from utils import SIM_COLORS, SCALE
 from utils import euclidean_distance, vec2d
 
@@ -9,7 +8,7 @@ class Obstacle(object):
     def __init__(self, screen, oid, otype, params):
         """
             screen:
-                Obstacles exists on a screen element 
+                Obstacles exists on a screen element (None when headless)
             oid:
                 obstacle id 
             otype: 
@@ -28,6 +27,8 @@ class Obstacle(object):
     def draw(self):
         """  draw obstacle with respective shape
         """
+        import pygame
+
         if self.type == 'Circle':
             pygame.draw.circle(self.screen, SIM_COLORS['blue'], 
                 (int(self._params[0]), int(self._params[1])), 
@@ -49,17 +50,24 @@ class Obstacle(object):
             Return a pair dist, point where point is the closet 
             point on the obstacle to the agent
         """
+        return self.point_distance((agent._position.x, agent._position.y))
+
+
+    def point_distance(self, point):
+        """ Compute the distance from obstacle boundary to a (x, y) point
+            Return a pair dist, point like agent_distance
+        """
         if self.type == 'Line':
-            return self._line_intersection(self.params, (agent._position.x, agent._position.y))
+            return self._line_intersection(self.params, point)
         elif self.type == 'Circle':
-            return self._circle_intersection(self.params, (agent._position.x, agent._position.y))
+            return self._circle_intersection(self.params, point)
         elif self.type == 'Rect':
             x, y, w, h = self.params
             candidates = dict()
-            d1, p1 = self._line_intersection((x, y, x+w, y), (agent._position.x, agent._position.y))
-            d2, p2 = self._line_intersection((x, y, x, y+h), (agent._position.x, agent._position.y))
-            d3, p3 = self._line_intersection((x+w, y, x+w, y+h), (agent._position.x, agent._position.y))
-            d4, p4 = self._line_intersection((x, y+h, x+w, y+h), (agent._position.x, agent._position.y))
+            d1, p1 = self._line_intersection((x, y, x+w, y), point)
+            d2, p2 = self._line_intersection((x, y, x, y+h), point)
+            d3, p3 = self._line_intersection((x+w, y, x+w, y+h), point)
+            d4, p4 = self._line_intersection((x, y+h, x+w, y+h), point)
             candidates[d1] = p1
             candidates[d2] = p2
             candidates[d3] = p3
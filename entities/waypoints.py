@@ -3,7 +3,6 @@
 from utils import SIM_COLORS, SCALE
 from utils import euclidean_distance, vec2d
 import math
-import pygame
 
 class Waypoint(object):
     """ Agent waypoints in the scene """
@@ -13,7 +12,7 @@ class Waypoint(object):
     def __init__(self, screen, wid, wtype, position, radius):
         """
             screen:
-                The screen on which the waypoint lives
+                The screen on which the waypoint lives (None when headless)
             wid:
                 waypoint id
             wtype: 
@@ -33,6 +32,8 @@ class Waypoint(object):
     def draw(self):
         """  draw waypoints as filled circles. All drawing works in px units
         """
+        import pygame
+
         pygame.draw.circle(
             self.screen, 
             SIM_COLORS['maroon'], 
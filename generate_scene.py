@@ -0,0 +1,313 @@
+import argparse
+from math import ceil, sqrt
+
+
+class SceneLayout(object):
+    """ Walls, waypoints and spawn areas of a generated scene, written
+        out in the SceneIO xml format by write(). All units are metres,
+        the field spans the walls (see SceneIO.get_field_size) so every
+        layout is closed by walls on its outside.
+    """
+    def __init__(self, segment_length=None):
+        """
+            segment_length:
+                split walls into line obstacles of at most this length
+                (CAD exports come as many short segments), None keeps one
+                obstacle per wall
+        """
+        self.segment_length = segment_length
+        self.waypoints = []
+        self.obstacles = []
+        self.spawn_areas = []
+        self.width = self.height = 0.0
+
+    def waypoint(self, wid, x, y, radius=0.5, wtype='normal'):
+        self.waypoints.append((wid, wtype, x, y, radius))
+        return wid
+
+    def wall(self, x1, y1, x2, y2):
+        pieces = 1
+        length = sqrt((x2 - x1)**2 + (y2 - y1)**2)
+        if self.segment_length:
+            pieces = max(1, int(ceil(length / self.segment_length)))
+
+        for k in xrange(pieces):
+            a, b = float(k) / pieces, float(k + 1) / pieces
+            self.obstacles.append(('wall%d' % len(self.obstacles), 'line',
+                                   x1 + a * (x2 - x1), y1 + a * (y2 - y1),
+                                   x1 + b * (x2 - x1), y1 + b * (y2 - y1)))
+        self.width = max(self.width, x1, x2)
+        self.height = max(self.height, y1, y2)
+
+    def wall_with_door(self, x1, y1, x2, y2, door, at=0.5):
+        """ A wall with a door of the given width, centered at the
+            fraction at of its length
+        """
+        length = sqrt((x2 - x1)**2 + (y2 - y1)**2)
+        a = max(0.0, at - door / 2.0 / length)
+        b = min(1.0, at + door / 2.0 / length)
+        if a > 0:
+            self.wall(x1, y1, x1 + a * (x2 - x1), y1 + a * (y2 - y1))
+        if b < 1:
+            self.wall(x1 + b * (x2 - x1), y1 + b * (y2 - y1), x2, y2)
+
+    def box(self, x1, y1, x2, y2):
+        self.wall(x1, y1, x2, y1)
+        self.wall(x2, y1, x2, y2)
+        self.wall(x2, y2, x1, y2)
+        self.wall(x1, y2, x1, y1)
+
+    def spawn(self, x1, y1, x2, y2, count, route, atype=0):
+        """ Place count agents following route (waypoint ids) evenly over
+            the rectangle
+        """
+        if count > 0:
+            self.spawn_areas.append((x1, y1, x2, y2, count, route, atype))
+
+    def _agents(self):
+        """ Generate (type, x, y, jitter, route) for every agent, on a
+            lattice covering each spawn area
+        """
+        for x1, y1, x2, y2, count, route, atype in self.spawn_areas:
+            w, h = x2 - x1, y2 - y1
+            cols = max(1, min(count, int(round(sqrt(count * w / h))) if h > 0 else count))
+            rows = int(ceil(float(count) / cols))
+            dx, dy = w / cols, h / rows
+            jitter = min(dx, dy) / 4.0
+            for k in xrange(count):
+                row, col = divmod(k, cols)
+                yield atype, x1 + (col + 0.5) * dx, y1 + (row + 0.5) * dy, jitter, route
+
+    def write(self, f, cell=0.5):
+        """ Write the scene as xml to the open file f
+        """
+        f.write('<simulation>\n\n')
+        f.write('    <parameters>\n')
+        f.write('        <display width="%g" height="%g"/>\n' % (self.width, self.height))
+        f.write('        <cell width="%g" height="%g"/>\n' % (cell, cell))
+        f.write('    </parameters>\n\n')
+
+        # waypoints must come before the agents using them
+        for wid, wtype, x, y, radius in self.waypoints:
+            f.write('    <waypoint id="%s" type="%s" x="%.3f" y="%.3f" radius="%.3f"/>\n' %
+                    (wid, wtype, x, y, radius))
+        f.write('\n')
+
+        for oid, otype, p1, p2, p3, p4 in self.obstacles:
+            f.write('    <obstacle id="%s" type="%s" p1="%.3f" p2="%.3f" p3="%.3f" p4="%.3f"/>\n' %
+                    (oid, otype, p1, p2, p3, p4))
+        f.write('\n')
+
+        # World.add_agents spawns a whole group at a single random point,
+        # so every agent gets a group of its own
+        for atype, x, y, jitter, route in self._agents():
+            f.write('    <agent type="%d" x="%.3f" y="%.3f" n="1" dx="%.3f" dy="%.3f">' %
+                    (atype, x, y, jitter, jitter))
+            f.write(''.join('<addwaypoint id="%s"/>' % wid for wid in route))
+            f.write('</agent>\n')
+
+        f.write('\n</simulation>\n')
+
+
+def _split(total, parts):
+    """ total split into parts integers as even as possible """
+    return [total // parts + (1 if k < total % parts else 0) for k in xrange(parts)]
+
+
+def corridor(agents, density=2.0, segment_length=None, width=4.0, length=None):
+    """ A straight corridor walked both ways, half of the crowd starting
+        at each end
+    """
+    if length is None:
+        length = max(20.0, agents / (density * width * 0.8))
+
+    layout = SceneLayout(segment_length)
+    layout.box(0, 0, length, width)
+    west = layout.waypoint('west', 0.5, width / 2, width * 0.4)
+    east = layout.waypoint('east', length - 0.5, width / 2, width * 0.4)
+
+    eastbound, westbound = _split(agents, 2)
+    layout.spawn(0.5, 0.5, length * 0.4, width - 0.5, eastbound, [east], 0)
+    layout.spawn(length * 0.6, 0.5, length - 0.5, width - 0.5, westbound, [west], 1)
+    return layout
+
+
+def bottleneck(agents, density=2.0, segment_length=None, door=1.2, room=None):
+    """ A square room emptying through a single door into an exit hall
+    """
+    if room is None:
+        room = max(6.0, sqrt(agents / density) + 2.0)
+    hall = 6.0
+
+    layout = SceneLayout(segment_length)
+    layout.wall(0, 0, room + hall, 0)
+    layout.wall(room + hall, 0, room + hall, room)
+    layout.wall(room + hall, room, 0, room)
+    layout.wall(0, room, 0, 0)
+    layout.wall_with_door(room, 0, room, room, door)
+
+    route = [layout.waypoint('door', room, room / 2, door / 2),
+             layout.waypoint('exit', room + hall - 1.0, room / 2, 1.0)]
+    layout.spawn(0.5, 0.5, room - 1.5, room - 0.5, agents, route)
+    return layout
+
+
+def crossing(agents, density=2.0, segment_length=None, width=4.0, arm=None):
+    """ Two corridors crossing at right angles, a quarter of the crowd
+        walking from every arm to the opposite one
+    """
+    if arm is None:
+        arm = max(8.0, agents / (density * width * 2.4))
+    a, b, size = arm, arm + width, 2 * arm + width
+
+    layout = SceneLayout(segment_length)
+    # corners of the cross
+    for x, y in ((a, a), (b, a), (b, b), (a, b)):
+        layout.wall(0 if x == a else size, y, x, y)
+        layout.wall(x, 0 if y == a else size, x, y)
+    # ends of the arms
+    layout.wall(a, 0, b, 0)
+    layout.wall(a, size, b, size)
+    layout.wall(0, a, 0, b)
+    layout.wall(size, a, size, b)
+
+    mid = size / 2
+    center = layout.waypoint('center', mid, mid, width * 0.4)
+    ends = dict(north=layout.waypoint('north', mid, 0.5, width * 0.4),
+                south=layout.waypoint('south', mid, size - 0.5, width * 0.4),
+                west=layout.waypoint('west', 0.5, mid, width * 0.4),
+                east=layout.waypoint('east', size - 0.5, mid, width * 0.4))
+
+    north, south, west, east = _split(agents, 4)
+    spawn_depth = arm * 0.6
+    layout.spawn(a + 0.5, 0.5, b - 0.5, spawn_depth, north, [center, ends['south']], 0)
+    layout.spawn(a + 0.5, size - spawn_depth, b - 0.5, size - 0.5, south, [center, ends['north']], 0)
+    layout.spawn(0.5, a + 0.5, spawn_depth, b - 0.5, west, [center, ends['east']], 1)
+    layout.spawn(size - spawn_depth, a + 0.5, size - 0.5, b - 0.5, east, [center, ends['west']], 1)
+    return layout
+
+
+def rooms(agents, density=2.0, segment_length=None, room=6.0, door=1.0, rows=None, cols=None):
+    """ A grid of rooms connected by doors, every room emptying towards
+        the exits on the east side, room after room
+    """
+    if rows is None or cols is None:
+        needed = max(1, int(ceil(agents / (density * (room - 1.0)**2))))
+        side = int(ceil(sqrt(needed)))
+        rows, cols = rows or side, cols or side
+
+    layout = SceneLayout(segment_length)
+    width, height = cols * room, rows * room
+
+    # outer walls, with an exit for every row on the east side
+    layout.wall(0, 0, width, 0)
+    layout.wall(0, height, width, height)
+    layout.wall(0, 0, 0, height)
+    for r in xrange(rows):
+        layout.wall_with_door(width, r * room, width, (r + 1) * room, door)
+
+    # inner walls, a door in the middle of each
+    for c in xrange(1, cols):
+        for r in xrange(rows):
+            layout.wall_with_door(c * room, r * room, c * room, (r + 1) * room, door)
+    for r in xrange(1, rows):
+        for c in xrange(cols):
+            layout.wall_with_door(c * room, r * room, (c + 1) * room, r * room, door)
+
+    doors = [[layout.waypoint('door_%d_%d' % (r, c), c * room, (r + 0.5) * room, door / 2)
+              for c in xrange(1, cols + 1)] for r in xrange(rows)]
+
+    counts = _split(agents, rows * cols)
+    for r in xrange(rows):
+        for c in xrange(cols):
+            layout.spawn(c * room + 0.5, r * room + 0.5, (c + 1) * room - 0.5, (r + 1) * room - 0.5,
+                         counts[r * cols + c], doors[r][c:], (r + c) % 2)
+    return layout
+
+
+def stadium(agents, density=2.0, segment_length=None, rows=None, seats=20, seat_width=0.5,
+            row_depth=0.9, aisle=1.2):
+    """ Stands made of sections of seat rows separated by aisles, above a
+        concourse with an exit below every aisle. Every seat row of a
+        section is an obstacle (its back), so large stands give
+        thousands of them
+    """
+    if rows is None:
+        rows = max(5, int(ceil(sqrt(agents / float(seats)))))
+    sections = max(1, int(ceil(agents / float(rows * seats))))
+    section_width = seats * seat_width
+    concourse = 5.0
+    stands = rows * row_depth
+    width = sections * section_width + (sections + 1) * aisle
+    height = stands + concourse
+
+    layout = SceneLayout(segment_length)
+    layout.wall(0, 0, width, 0)
+    layout.wall(0, 0, 0, height)
+    layout.wall(width, 0, width, height)
+
+    aisles = [k * (section_width + aisle) + aisle / 2 for k in xrange(sections + 1)]
+    exits = []
+    for k, x in enumerate(aisles):
+        exits.append(layout.waypoint('exit_%d' % k, x, height - 0.5, aisle / 2))
+    # the bottom wall, with the exits in it
+    for k, x in enumerate(aisles):
+        left = 0 if k == 0 else aisles[k - 1] + aisle / 2
+        layout.wall(left, height, x - aisle / 2, height)
+    layout.wall(aisles[-1] + aisle / 2, height, width, height)
+
+    counts = _split(agents, sections * rows)
+    for s in xrange(sections):
+        x1 = aisle + s * (section_width + aisle)
+        x2 = x1 + section_width
+        for r in xrange(rows):
+            y = (r + 1) * row_depth
+            # back of the seats in front of the row
+            layout.wall(x1, y, x2, y)
+
+            # leave the row by the closer aisle, then down to its exit
+            k = s if r % 2 == 0 else s + 1
+            route = ['aisle_%d_%d' % (k, r), 'aisle_%d_bottom' % k, exits[k]]
+            layout.spawn(x1, y - row_depth + 0.2, x2, y - 0.2, counts[s * rows + r], route, s % 2)
+
+    # waypoints along the aisles
+    for k, x in enumerate(aisles):
+        for r in xrange(rows):
+            layout.waypoint('aisle_%d_%d' % (k, r), x, (r + 0.5) * row_depth, aisle / 2)
+        layout.waypoint('aisle_%d_bottom' % k, x, stands + 1.0, aisle / 2)
+    return layout
+
+
+LAYOUTS = dict(corridor=corridor, bottleneck=bottleneck, crossing=crossing, rooms=rooms, stadium=stadium)
+
+
+def generate_scene(filename, layout, agents, density=2.0, segment_length=None, cell=0.5, **options):
+    """ Write a scene of the given layout (see LAYOUTS) for agents
+        agents to filename, returns the SceneLayout
+    """
+    scene = LAYOUTS[layout](agents, density, segment_length, **options)
+    with open(filename, 'w') as f:
+        scene.write(f, cell)
+    return scene
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a scene file for scale tests')
+    parser.add_argument('layout', choices=sorted(LAYOUTS),
+                        help='kind of venue')
+    parser.add_argument('output',
+                        help='scene file to write')
+    parser.add_argument('--agents', type=int, default=100,
+                        help='number of agents')
+    parser.add_argument('--density', type=float, default=2.0,
+                        help='agents per square metre of spawn area, sizes the venue')
+    parser.add_argument('--segment-length', type=float, default=None,
+                        help='split walls into obstacles of at most this length (metres)')
+    parser.add_argument('--cell', type=float, default=0.5,
+                        help='grid cell size of the scene (metres)')
+    args = parser.parse_args()
+
+    scene = generate_scene(args.output, args.layout, args.agents, args.density, args.segment_length,
+                           args.cell)
+    print '%s: %d agents, %d obstacles, %d waypoints, %.1f x %.1f m' % (
+        args.output, args.agents, len(scene.obstacles), len(scene.waypoints), scene.width, scene.height)
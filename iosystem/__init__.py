@@ -1 +1,6 @@
-from scene_io import SceneIO
\ No newline at end of file
+from scene_io import SceneIO
+from scene_stream import SceneStream
+from compiled_scene import CompiledScene, open_scene
+from trajectory import TrajectoryRecorder, TrajectoryReader
+from writer import BackgroundWriter, BACKPRESSURE
+from checkpoint import save_checkpoint, read_checkpoint, restore_random_state
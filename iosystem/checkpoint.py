@@ -0,0 +1,100 @@
+# full simulation state checkpoints, as numpy .npz archives
+
+import json
+import random
+
+import numpy as np
+
+from physics import CrowdState
+
+
+VERSION = 1
+
+# per agent arrays of a checkpoint, named after the CrowdState arrays
+AGENT_ARRAYS = ('ids', 'types', 'vmax', 'radius', 'relaxation_time', 'route_lengths') + \
+               CrowdState.MUTABLE_ROWS
+
+
+def save_checkpoint(world, filename):
+    """ Write the complete state of a World to filename: parameters,
+        time, waypoints, obstacles, agents, the controller's own state
+        and the state of both random number generators (see
+        World.from_checkpoint to restore it)
+    """
+    data = dict(version=np.array(VERSION))
+
+    data['params'] = np.array(json.dumps(world.params))
+    data['settings'] = np.array(json.dumps(dict(
+        step_size=world.STEP_SIZE,
+        speed_distribution=world.SPEED_DISTRIBUTION,
+        batch_mode=world.batch_mode,
+        obstacle_compilation=world._obstacle_compilation,
+        factors=getattr(world.controller, 'factors', None),
+        controller=type(world.controller).__name__)))
+    data['time'] = np.array([world.sim_time, world.step_count], dtype=np.float64)
+
+    # waypoints and obstacles, in pixels as the entities keep them
+    waypoints = [world.waypoints[wid] for wid in sorted(world.waypoints)]
+    data['waypoints'] = np.array(json.dumps([(wp.id, wp.type) for wp in waypoints]))
+    data['waypoint_geometry'] = np.array([(wp._position.x, wp._position.y, wp._radius)
+                                          for wp in waypoints], dtype=np.float64).reshape(-1, 3)
+    data['obstacles'] = np.array(json.dumps([(obstacle.id, obstacle.type) for obstacle in world.obstacles]))
+    data['obstacle_geometry'] = np.array([obstacle._params for obstacle in world.obstacles],
+                                         dtype=np.float64).reshape(-1, 4)
+
+    # agents, their routes pointing into the waypoints above
+    state = world.crowd_state() if world.batch_mode else CrowdState(world.agents)
+    for name in AGENT_ARRAYS:
+        data['agent_' + name] = getattr(state, name)
+
+    slots = dict((id(wp), k) for k, wp in enumerate(waypoints))
+    routes = np.zeros_like(state.routes)
+    for k, agent in enumerate(state.agents):
+        routes[k, :len(agent._waypoints)] = [slots[id(wp)] for wp in agent._waypoints]
+    data['agent_routes'] = routes
+
+    # state the controller keeps between steps (see Controller.get_state)
+    for name, value in world.controller.get_state().iteritems():
+        data['controller_' + name] = np.asarray(value)
+
+    # random number generators
+    version, internal, gauss = random.getstate()
+    data['python_random'] = np.array(internal, dtype=np.uint64)
+    data['python_random_gauss'] = np.array([version, np.nan if gauss is None else gauss])
+    name, keys, pos, has_gauss, cached = np.random.get_state()
+    data['numpy_random'] = keys
+    data['numpy_random_extra'] = np.array([pos, has_gauss, cached], dtype=np.float64)
+
+    with open(filename, 'wb') as f:
+        np.savez(f, **data)
+
+
+def read_checkpoint(filename):
+    """ Read back a checkpoint written by save_checkpoint as a dict of
+        plain values and arrays
+    """
+    archive = np.load(filename, allow_pickle=False)
+    try:
+        if int(archive['version']) != VERSION:
+            raise ValueError('unsupported checkpoint version %d' % int(archive['version']))
+
+        checkpoint = dict((name, archive[name]) for name in archive.files)
+    finally:
+        archive.close()
+
+    for name in ('params', 'settings', 'waypoints', 'obstacles'):
+        checkpoint[name] = json.loads(checkpoint[name].item())
+    checkpoint['controller_state'] = dict((name[len('controller_'):], checkpoint.pop(name))
+                                          for name in list(checkpoint) if name.startswith('controller_'))
+    return checkpoint
+
+
+def restore_random_state(checkpoint):
+    """ Put both random number generators back in their checkpointed state
+    """
+    version, gauss = checkpoint['python_random_gauss'].tolist()
+    random.setstate((int(version), tuple(int(v) for v in checkpoint['python_random']),
+                     None if np.isnan(gauss) else gauss))
+
+    pos, has_gauss, cached = checkpoint['numpy_random_extra'].tolist()
+    np.random.set_state(('MT19937', checkpoint['numpy_random'], int(pos), int(has_gauss), cached))
@@ -0,0 +1,176 @@
+# scenes compiled to typed arrays, cached next to their xml file
+
+import hashlib
+import json
+import os
+from array import array
+
+import numpy as np
+
+from scene_stream import SceneStream
+
+
+VERSION = 1
+
+
+def _as_list(elements):
+    """ SceneIO gives a single element instead of a list of one """
+    if elements is None:
+        return []
+    if isinstance(elements, dict):
+        return [elements]
+    return elements
+
+
+def scene_hash(scene_file):
+    """ Content hash of a scene file, keying its compiled cache """
+    digest = hashlib.sha1()
+    with open(scene_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), ''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_file(scene_file):
+    """ Where the compiled form of a scene file is cached """
+    return os.path.splitext(scene_file)[0] + '.compiled.npz'
+
+
+class CompiledScene(object):
+    """ A scene held as typed arrays (waypoints, obstacles and agent
+        spawn groups) rather than the nested dicts of strings SceneIO
+        builds from the xml. It offers the getters of SceneIO, so it can
+        be used in its place, and is saved to and loaded from a binary
+        .npz file (see open_scene).
+    """
+    def __init__(self, arrays):
+        """
+            arrays:
+                the arrays of a compiled scene, see compile/load
+        """
+        self.arrays = arrays
+        self.source_hash = str(arrays['source_hash'])
+        self._parameters = json.loads(str(arrays['parameters']))
+
+    @classmethod
+    def compile(cls, sio, source_hash=''):
+        """ Compile a scene read by SceneIO or SceneStream, in a single
+            pass over its elements
+        """
+        waypoint_ids, waypoint_types, waypoints = [], [], array('d')
+        obstacle_ids, obstacle_types, obstacles = [], [], array('d')
+        agent_types, agent_counts, agents = array('l'), array('l'), array('d')
+        routes, route_offsets = array('l'), array('l', [0])
+        slots = dict()
+
+        for tag, element in sio.elements():
+            if tag == 'waypoint':
+                slots[element['id']] = len(waypoint_ids)
+                waypoint_ids.append(element['id'])
+                waypoint_types.append(element['type'])
+                waypoints.extend(float(element[key]) for key in ('x', 'y', 'radius'))
+            elif tag == 'obstacle':
+                obstacle_ids.append(element['id'])
+                obstacle_types.append(element['type'])
+                obstacles.extend(float(element[key]) for key in ('p1', 'p2', 'p3', 'p4'))
+            elif tag == 'agent':
+                agent_types.append(int(element['type']))
+                agent_counts.append(int(element['n']))
+                agents.extend(float(element[key]) for key in ('x', 'y', 'dx', 'dy'))
+                # routes as waypoint indices, flattened with offsets
+                routes.extend(slots[awp['id']] for awp in _as_list(element.get('addwaypoint')))
+                route_offsets.append(len(routes))
+
+        arrays = dict(
+            version=np.array(VERSION),
+            source_hash=np.array(source_hash),
+            parameters=np.array(json.dumps(sio.get_parameters())),
+
+            waypoint_ids=np.array(waypoint_ids, dtype=str),
+            waypoint_types=np.array(waypoint_types, dtype=str),
+            waypoints=np.frombuffer(waypoints, dtype=np.float64).reshape(-1, 3),
+
+            obstacle_ids=np.array(obstacle_ids, dtype=str),
+            obstacle_types=np.array(obstacle_types, dtype=str),
+            obstacles=np.frombuffer(obstacles, dtype=np.float64).reshape(-1, 4),
+
+            agent_types=np.array(agent_types, dtype=np.intp),
+            agent_counts=np.array(agent_counts, dtype=np.intp),
+            agents=np.frombuffer(agents, dtype=np.float64).reshape(-1, 4),
+            agent_routes=np.array(routes, dtype=np.intp),
+            agent_route_offsets=np.array(route_offsets, dtype=np.intp))
+        return cls(arrays)
+
+    @classmethod
+    def load(cls, filename):
+        archive = np.load(filename, allow_pickle=False)
+        try:
+            if int(archive['version']) != VERSION:
+                raise ValueError('unsupported compiled scene version %d' % int(archive['version']))
+            arrays = dict((name, archive[name]) for name in archive.files)
+        finally:
+            archive.close()
+        return cls(arrays)
+
+    def save(self, filename):
+        with open(filename, 'wb') as f:
+            np.savez(f, **self.arrays)
+
+    # SceneIO interface, the values are already converted
+    def get_parameters(self):
+        return json.loads(json.dumps(self._parameters))
+
+    def get_waypoints(self):
+        a = self.arrays
+        return [dict(id=wid, type=wtype, x=x, y=y, radius=radius)
+                for wid, wtype, (x, y, radius) in zip(a['waypoint_ids'].tolist(), a['waypoint_types'].tolist(),
+                                                      a['waypoints'].tolist())]
+
+    def get_obstacles(self):
+        a = self.arrays
+        return [dict(id=oid, type=otype, p1=p1, p2=p2, p3=p3, p4=p4)
+                for oid, otype, (p1, p2, p3, p4) in zip(a['obstacle_ids'].tolist(), a['obstacle_types'].tolist(),
+                                                        a['obstacles'].tolist())]
+
+    def get_agents(self):
+        a = self.arrays
+        waypoint_ids = a['waypoint_ids'].tolist()
+        routes, offsets = a['agent_routes'].tolist(), a['agent_route_offsets'].tolist()
+        return [dict(type=atype, n=n, x=x, y=y, dx=dx, dy=dy,
+                     addwaypoint=[dict(id=waypoint_ids[slot]) for slot in routes[offsets[k]:offsets[k + 1]]])
+                for k, (atype, n, (x, y, dx, dy)) in enumerate(zip(a['agent_types'].tolist(),
+                                                                   a['agent_counts'].tolist(),
+                                                                   a['agents'].tolist()))]
+
+    def get_field_size(self):
+        p = self._parameters
+        return (p['field_top_left_x'], p['field_top_left_y'],
+                p['field_bottom_right_x'], p['field_bottom_right_y'])
+
+
+def open_scene(scene_file, cache=True):
+    """ The scene of an xml file, compiled. The compiled form is cached
+        next to the xml (see cache_file) and used instead of parsing it
+        for as long as the xml content has not changed. The xml is read
+        incrementally (see SceneStream)
+    """
+    if not cache:
+        return CompiledScene.compile(SceneStream(scene_file))
+
+    source_hash = scene_hash(scene_file)
+    cached = cache_file(scene_file)
+    if os.path.exists(cached):
+        try:
+            scene = CompiledScene.load(cached)
+            if scene.source_hash == source_hash:
+                return scene
+        except (IOError, ValueError, KeyError):
+            pass
+
+    scene = CompiledScene.compile(SceneStream(scene_file), source_hash)
+    try:
+        scene.save(cached)
+    except (IOError, OSError):
+        # read-only location, just go without the cache
+        pass
+    return scene
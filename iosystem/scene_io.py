@@ -44,6 +44,18 @@ class SceneIO(object):
             })
         return pd
 
+    def elements(self):
+        """ Generate (tag, dict) for the elements of the scene like
+            SceneStream.elements, grouped by tag rather than in file order
+        """
+        simulation = self._dict['simulation']
+        if 'parameters' in simulation:
+            yield 'parameters', simulation['parameters']
+        for tag in ('waypoint', 'obstacle', 'agent'):
+            elements = simulation.get(tag, [])
+            for element in [elements] if isinstance(elements, dict) else elements:
+                yield tag, element
+
     def get_field_size(self):
         obstacle_dict = self.get_obstacles()
 
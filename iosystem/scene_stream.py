@@ -0,0 +1,118 @@
+# incremental scene loading, for scene files too big to hold in memory
+
+try:
+    import xml.etree.cElementTree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+
+
+class SceneStream(object):
+    """ Reads a scene file incrementally (iterparse), handing out its
+        elements one at a time and dropping each one once it has been
+        handed out, so memory use does not grow with the file size.
+
+        Elements come as the same dicts of strings SceneIO gives. The
+        getters of SceneIO are available too, the element getters
+        returning generators; each of them goes through the file once.
+    """
+    def __init__(self, scene_file):
+        """
+            scene_file:
+                The filename of the scene (eg. scene.xml)
+        """
+        self._scene_file = scene_file
+        self._parameters = None
+
+    def elements(self):
+        """ Generate (tag, dict) for the elements of the scene in file
+            order: 'parameters', 'waypoint', 'obstacle' and 'agent' (the
+            latter with its 'addwaypoint' list)
+        """
+        depth = 0
+        root = None
+        for event, element in ET.iterparse(self._scene_file, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = element
+                depth += 1
+                continue
+
+            depth -= 1
+            if depth != 1:
+                continue
+
+            if element.tag == 'parameters':
+                yield element.tag, dict((child.tag, dict(child.attrib)) for child in element)
+            elif element.tag == 'agent':
+                agent = dict(element.attrib)
+                agent['addwaypoint'] = [dict(child.attrib) for child in element if child.tag == 'addwaypoint']
+                yield element.tag, agent
+            else:
+                yield element.tag, dict(element.attrib)
+
+            # forget about everything read so far
+            root.clear()
+
+    def _iter(self, tag):
+        for element_tag, element in self.elements():
+            if element_tag == tag:
+                yield element
+
+    def get_waypoints(self):
+        return self._iter('waypoint')
+
+    def get_obstacles(self):
+        return self._iter('obstacle')
+
+    def get_agents(self):
+        return self._iter('agent')
+
+    def get_parameters(self):
+        """ The scene parameters along with the field bounds, like
+            SceneIO.get_parameters (takes a pass over the file the first
+            time)
+        """
+        if self._parameters is None:
+            parameters = dict()
+            bounds = [float('inf'), float('inf'), float('-inf'), float('-inf')]
+            for tag, element in self.elements():
+                if tag == 'parameters':
+                    parameters = element
+                elif tag == 'obstacle':
+                    x1, y1, x2, y2 = [float(element[p]) for p in ('p1', 'p2', 'p3', 'p4')]
+                    bounds = [min(bounds[0], x1, x2), min(bounds[1], y1, y2),
+                              max(bounds[2], x1, x2), max(bounds[3], y1, y2)]
+
+            parameters.update({'field_top_left_x': bounds[0],
+                               'field_top_left_y': bounds[1],
+                               'field_bottom_right_x': bounds[2],
+                               'field_bottom_right_y': bounds[3]})
+            self._parameters = parameters
+
+        return dict(self._parameters)
+
+    def get_field_size(self):
+        p = self.get_parameters()
+        return (p['field_top_left_x'], p['field_top_left_y'],
+                p['field_bottom_right_x'], p['field_bottom_right_y'])
+
+    def load_into(self, world, chunk_size=1024):
+        """ Add the waypoints, obstacles and agents of the scene to the
+            world in a single pass, chunk_size elements at a time
+            (waypoints have to come before the agents using them)
+        """
+        adders = dict(waypoint=world.add_waypoints, obstacle=world.add_obstacles, agent=world.add_agents)
+
+        pending_tag, pending = None, []
+        for tag, element in self.elements():
+            if tag not in adders:
+                continue
+            if pending and (tag != pending_tag or len(pending) >= chunk_size):
+                adders[pending_tag](pending)
+                pending = []
+            pending_tag = tag
+            pending.append(element)
+
+        if pending:
+            adders[pending_tag](pending)
+        return world
@@ -0,0 +1,297 @@
+# binary trajectory files: the step and time of every frame, then one
+# float32 record per agent
+
+import os
+
+import numpy as np
+
+from physics import CrowdState
+
+
+# columns of an agent record, forces are the unweighted components
+FIELDS = ('x', 'y', 'vx', 'vy', 'waypoint',
+          'social_x', 'social_y', 'desired_x', 'desired_y',
+          'obstacle_x', 'obstacle_y', 'lookahead_x', 'lookahead_y')
+
+MAGIC = 'CSTRAJ'
+VERSION = 2
+
+# the header is padded to HEADER_SIZE bytes, frames follow it
+HEADER = np.dtype([('magic', 'S8'), ('version', '<u4'), ('agents', '<u4'), ('fields', '<u4'),
+                   ('reserved', '<u4'), ('dt', '<f8'), ('start_time', '<f8'), ('frames', '<u8')])
+HEADER_SIZE = 64
+
+RECORD = np.dtype('<f4')
+
+
+def frame_dtype(agents, version=VERSION):
+    """ The dtype of a frame of the given number of agents. Version 1
+        frames only hold the records, their step and time follow from
+        their position in the file
+    """
+    if version == 1:
+        return np.dtype((RECORD, (agents, len(FIELDS))))
+    return np.dtype([('step', '<u8'), ('time', '<f8'), ('records', RECORD, (agents, len(FIELDS)))])
+
+
+def pack(state, out=None):
+    """ The (agents, fields) float32 frame of a CrowdState, written into
+        out when given
+    """
+    if out is None:
+        out = np.empty((len(state), len(FIELDS)), dtype=RECORD)
+    out[:, 0:2] = state.positions
+    out[:, 2:4] = state.velocities
+    out[:, 4] = state.waypoint_index
+    out[:, 5:7] = state.social_force
+    out[:, 7:9] = state.desired_force
+    out[:, 9:11] = state.obstacle_force
+    out[:, 11:13] = state.lookahead_force
+    return out
+
+
+class TrajectoryRecorder(object):
+    """ Appends the state of a crowd after every step to a memory-mapped
+        binary file. A frame holds the step count and simulated time it
+        was taken at, then a record of len(FIELDS) float32 per agent,
+        laid out as a (agents, fields) array; frames follow each other
+        after a small header (agent count, dt, frames written). Frames
+        need not be taken every step (see BackgroundWriter).
+
+        The file is preallocated chunk_frames frames at a time and
+        trimmed to the frames actually written on close(); the frame
+        count in the header is kept up to date so an interrupted file
+        can still be read back (see TrajectoryReader).
+    """
+    def __init__(self, filename, agents, dt, start_time=0.0, chunk_frames=256):
+        """
+            filename:
+                file to (over)write
+            agents:
+                number of agents in every frame
+            dt:
+                simulated time of a step (seconds)
+            start_time:
+                simulated time of the first frame, unless given when
+                recording it
+            chunk_frames:
+                number of frames the file grows by when full
+        """
+        self.filename = filename
+        self.agents = agents
+        self.chunk_frames = max(1, chunk_frames)
+        self.frame_dtype = frame_dtype(agents)
+        self.frame_size = self.frame_dtype.itemsize
+        self.dt = dt
+        self.start_time = start_time
+        self.frames = 0
+        self._last = None
+        self._capacity = 0
+        self._data = None
+        self._header = None
+        self._agent_state = None
+
+        with open(filename, 'wb') as f:
+            f.write('\0' * HEADER_SIZE)
+
+        self._map(0)
+        self._header['magic'] = MAGIC
+        self._header['version'] = VERSION
+        self._header['agents'] = agents
+        self._header['fields'] = len(FIELDS)
+        self._header['dt'] = dt
+        self._header['start_time'] = start_time
+        self._header['frames'] = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _unmap(self):
+        if self._header is not None:
+            self._header.flush()
+        if self._data is not None:
+            self._data.flush()
+        self._header = self._data = None
+
+    def _map(self, capacity):
+        """ Resize the file to hold capacity frames and map it again
+        """
+        self._unmap()
+        with open(self.filename, 'r+b') as f:
+            f.truncate(HEADER_SIZE + capacity * self.frame_size)
+
+        self._capacity = capacity
+        self._header = np.memmap(self.filename, dtype=HEADER, mode='r+', shape=(1,))
+        if capacity > 0:
+            self._data = np.memmap(self.filename, dtype=self.frame_dtype, mode='r+', offset=HEADER_SIZE,
+                                   shape=(capacity,))
+
+    def next_frame(self, step=None, time=None):
+        """ The (agents, fields) float32 array of the next frame to fill
+            in, growing the file when needed
+
+            step, time:
+                step count and simulated time of the frame, by default
+                the step after the last frame's and its time dt later
+        """
+        if self._header is None:
+            raise ValueError('trajectory recorder is closed')
+        if self._last is None:
+            last_step, last_time = -1, self.start_time - self.dt
+        else:
+            last_step, last_time = self._last
+        if step is None:
+            step = last_step + 1
+        if time is None:
+            time = last_time + (step - last_step) * self.dt
+
+        if self.frames == self._capacity:
+            self._map(self._capacity + self.chunk_frames)
+
+        frame = self._data[self.frames]
+        frame['step'] = step
+        frame['time'] = time
+        self._last = step, time
+        self.frames += 1
+        self._header['frames'] = self.frames
+        return frame['records']
+
+    def record(self, state, step=None, time=None):
+        """ Append a frame holding the given CrowdState, step and time
+            as in next_frame
+        """
+        if len(state) != self.agents:
+            raise ValueError('expected %d agents, got %d' % (self.agents, len(state)))
+
+        pack(state, self.next_frame(step, time))
+
+    def write_frame(self, frame, step=None, time=None):
+        """ Append an already packed frame (see pack), step and time as
+            in next_frame
+        """
+        if len(frame) != self.agents:
+            raise ValueError('expected %d agents, got %d' % (self.agents, len(frame)))
+
+        self.next_frame(step, time)[:] = frame
+
+    def _world_state(self, world):
+        if world.batch_mode:
+            return world.crowd_state()
+
+        # stepped agent by agent, gather them into a state of our own
+        if self._agent_state is None or len(self._agent_state) != len(world.agents):
+            self._agent_state = CrowdState(world.agents)
+        else:
+            self._agent_state.load()
+        return self._agent_state
+
+    def record_world(self, world):
+        """ Append a frame holding the current state of the world's agents
+        """
+        self.record(self._world_state(world), world.step_count, world.sim_time)
+
+    def snapshot(self, world):
+        """ A packed copy of the current state of the world's agents,
+            along with the step and time it was taken at, to be written
+            later on by write_snapshot (eg. from a BackgroundWriter)
+        """
+        return world.step_count, world.sim_time, pack(self._world_state(world))
+
+    def write_snapshot(self, snapshot):
+        """ Append a frame taken by snapshot
+        """
+        step, time, frame = snapshot
+        self.write_frame(frame, step, time)
+
+    def close(self):
+        """ Trim the file to the frames written and release it
+        """
+        if self._header is None:
+            return
+        self._map(self.frames)
+        self._unmap()
+
+
+class TrajectoryReader(object):
+    """ Read access to a file written by TrajectoryRecorder. Frames are
+        mapped from the file, not loaded, so files larger than memory
+        can be read. Files of the previous version, without the step and
+        time of their frames, are read as if a frame was taken every step
+    """
+    def __init__(self, filename):
+        self.filename = filename
+
+        header = np.fromfile(filename, dtype=HEADER, count=1)
+        if len(header) == 0 or header['magic'][0] != MAGIC:
+            raise ValueError('%s is not a trajectory file' % filename)
+        self.version = int(header['version'][0])
+        if self.version not in (1, VERSION):
+            raise ValueError('unsupported trajectory file version %d' % self.version)
+
+        self.agents = int(header['agents'][0])
+        self.fields = int(header['fields'][0])
+        self.dt = float(header['dt'][0])
+        self.start_time = float(header['start_time'][0])
+
+        # trust the frames that are actually on disk
+        dtype = frame_dtype(self.agents, self.version)
+        on_disk = (os.path.getsize(filename) - HEADER_SIZE) // dtype.itemsize if dtype.itemsize else 0
+        self.frames = int(min(header['frames'][0], on_disk))
+
+        # (frames, agents, fields) records, steps and times of the frames
+        if self.frames == 0:
+            self.data = np.zeros((0, self.agents, self.fields), dtype=RECORD)
+            self.steps = np.zeros(0, dtype=np.intp)
+            self.times = np.zeros(0)
+        elif self.version == 1:
+            self.data = np.memmap(filename, dtype=RECORD, mode='r', offset=HEADER_SIZE,
+                                  shape=(self.frames, self.agents, self.fields))
+            self.steps = np.arange(self.frames)
+            self.times = self.start_time + self.steps * self.dt
+        else:
+            frames = np.memmap(filename, dtype=dtype, mode='r', offset=HEADER_SIZE, shape=(self.frames,))
+            self.data = frames['records']
+            self.steps = frames['step'].astype(np.intp)
+            self.times = frames['time'].astype(float)
+
+    def __len__(self):
+        return self.frames
+
+    def __getitem__(self, k):
+        """ The (agents, fields) array of frame k
+        """
+        return self.data[k]
+
+    def step(self, k):
+        """ Step count of frame k
+        """
+        return int(self.steps[k])
+
+    def time(self, k):
+        """ Simulated time of frame k
+        """
+        return float(self.times[k])
+
+    def frame_at(self, time):
+        """ The last frame taken at or before the given simulated time
+            (the first one before the recording starts)
+        """
+        return max(0, int(np.searchsorted(self.times, time, side='right')) - 1)
+
+    def column(self, name, frames=slice(None)):
+        """ A single field (see FIELDS) of the given frames, eg.
+            column('x') is a (frames, agents) array
+        """
+        return self.data[frames, :, FIELDS.index(name)]
+
+    def positions(self, k):
+        return self.data[k, :, 0:2]
+
+    def velocities(self, k):
+        return self.data[k, :, 2:4]
+
+    def waypoint_index(self, k):
+        return self.data[k, :, 4].astype(np.intp)
@@ -0,0 +1,138 @@
+# output written from a background thread, off the simulation loop
+
+import atexit
+import threading
+import Queue
+
+
+BACKPRESSURE = ('block', 'drop', 'decimate')
+
+# queued to tell the writer thread to stop
+_STOP = object()
+
+
+class BackgroundWriter(object):
+    """ Hands items (eg. step snapshots, see TrajectoryRecorder.snapshot)
+        over to a thread that writes them out, so the simulation does
+        not wait on the disk. Items must not change once put(), pass
+        copies.
+
+        The queue between the two is bounded, when the writer falls
+        behind and it is full, put() either:
+
+            block:
+                waits for room, nothing is lost
+            drop:
+                drops the item
+            decimate:
+                drops the item and from then on only accepts every
+                other item (then every 4th, 8th...) until the writer
+                has caught up with the whole queue
+
+        Pending items are written out on close(), which also runs at
+        interpreter exit.
+    """
+    def __init__(self, write, close=None, queue_size=64, backpressure='block'):
+        """
+            write:
+                called with every item, from the writer thread
+            close:
+                called once everything is written (optional)
+            queue_size:
+                number of items waiting to be written at most
+            backpressure:
+                one of BACKPRESSURE
+        """
+        if backpressure not in BACKPRESSURE:
+            raise ValueError('unknown backpressure policy: %s' % backpressure)
+
+        self.backpressure = backpressure
+        self.written = 0
+        self.dropped = 0
+        self.stride = 1
+        self._write = write
+        self._close = close
+        self._offered = 0
+        self._error = None
+        self._closed = False
+
+        self._queue = Queue.Queue(max(1, queue_size))
+        self._thread = threading.Thread(target=self._run, name='BackgroundWriter')
+        self._thread.daemon = True
+        self._thread.start()
+        atexit.register(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            if self._error is not None:
+                continue
+
+            try:
+                self._write(item)
+                self.written += 1
+            except Exception as error:
+                # raised again on the simulation thread by put/close
+                self._error = error
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def put(self, item):
+        """ Queue an item for writing, returns whether it was accepted
+        """
+        if self._closed:
+            raise ValueError('background writer is closed')
+        self._raise_error()
+
+        if self.backpressure == 'block':
+            self._queue.put(item)
+            return True
+
+        if self.backpressure == 'decimate':
+            if self._queue.empty():
+                self.stride = 1
+            self._offered += 1
+            if self._offered % self.stride != 0:
+                self.dropped += 1
+                return False
+
+        try:
+            self._queue.put_nowait(item)
+        except Queue.Full:
+            self.dropped += 1
+            if self.backpressure == 'decimate':
+                self.stride *= 2
+                self._offered = 0
+            return False
+        return True
+
+    @property
+    def pending(self):
+        """ Number of items waiting to be written
+        """
+        return self._queue.qsize()
+
+    def close(self):
+        """ Write out everything queued, stop the thread and close the
+            output. Safe to call more than once
+        """
+        if self._closed:
+            return
+        self._closed = True
+
+        self._queue.put(_STOP)
+        self._thread.join()
+        if self._close is not None:
+            self._close()
+        self._raise_error()
@@ -0,0 +1,152 @@
+import argparse
+import json
+import sys
+
+from benchmark import run_benchmarks, format_result, PHASES
+
+
+def case_key(result):
+    """ What a benchmark result is matched on between runs """
+    return result['scene'], result['mode'], result['obstacle_method'], result['agents'], \
+           result.get('verlet_skin')
+
+
+def metrics(result):
+    """ The metrics of a result as (name, value, higher is better) """
+    yield 'steps/s', result['steps_per_sec'], True
+    for phase in PHASES:
+        yield phase, result['phases'][phase], False
+
+
+def best_of(reports):
+    """ Merge repeated benchmark runs of the same cases, keeping the best
+        value of every metric (timing noise only ever makes things slower)
+    """
+    best = dict()
+    for report in reports:
+        for result in report['results']:
+            key = case_key(result)
+            if key not in best:
+                best[key] = json.loads(json.dumps(result))
+                continue
+            merged = best[key]
+            merged['steps_per_sec'] = max(merged['steps_per_sec'], result['steps_per_sec'])
+            for phase in PHASES:
+                merged['phases'][phase] = min(merged['phases'][phase], result['phases'][phase])
+
+    report = dict(reports[0])
+    report['results'] = [best[case_key(result)] for result in reports[0]['results']]
+    return report
+
+
+def compare(baseline, current, tolerance=0.1, min_time=5e-5):
+    """ Compare two benchmark reports case by case, returns one row per
+        metric (case, metric, baseline, current, change, regressed)
+
+        tolerance:
+            relative slowdown allowed before a metric counts as regressed
+        min_time:
+            phase times (seconds per step) are only compared when they
+            differ by more than this, short phases are mostly noise
+    """
+    results = dict((case_key(result), result) for result in current['results'])
+
+    rows = []
+    for base in baseline['results']:
+        key = case_key(base)
+        name = '%s %s %s %d' % key[:4]
+        if key[4] is not None:
+            name += ' verlet %g' % key[4]
+        if key not in results:
+            rows.append((name, 'missing', None, None, None, True))
+            continue
+
+        current_metrics = dict((metric, value) for metric, value, _ in metrics(results[key]))
+        for metric, value, higher_is_better in metrics(base):
+            new = current_metrics[metric]
+            if not value:
+                # phases the baseline did not run (drawing)
+                if new:
+                    rows.append((name, metric, value, new, None, False))
+                continue
+            change = new / value - 1.0
+            if higher_is_better:
+                regressed = change < -tolerance
+            else:
+                regressed = change > tolerance and new - value > min_time
+            rows.append((name, metric, value, new, change, regressed))
+    return rows
+
+
+def format_table(rows, regressions_only=False):
+    """ The comparison as a plain text table """
+    def cell(metric, value):
+        if value is None:
+            return '-'
+        if metric == 'steps/s':
+            return '%.1f' % value
+        return '%.3fms' % (value * 1000)
+
+    header = ('case', 'metric', 'baseline', 'current', 'change', '')
+    lines = [header]
+    for name, metric, value, new, change, regressed in rows:
+        if regressions_only and not regressed:
+            continue
+        lines.append((name, metric, cell(metric, value), cell(metric, new),
+                      '-' if change is None else '%+.1f%%' % (change * 100),
+                      'REGRESSION' if regressed else ''))
+
+    widths = [max(len(line[k]) for line in lines) for k in xrange(len(header))]
+    return '\n'.join('  '.join(value.ljust(width) if k < 2 else value.rjust(width)
+                               for k, (value, width) in enumerate(zip(line, widths))).rstrip()
+                     for line in lines)
+
+
+def rerun(baseline, repeat=3, log=None):
+    """ Run the benchmarks of a baseline report again, repeat times """
+    return best_of([run_benchmarks(log=log, **baseline['config']) for _ in xrange(repeat)])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Re-run the benchmarks of a baseline (see benchmark.py) '
+                                                 'and fail if any of them got slower')
+    parser.add_argument('baseline',
+                        help='benchmark JSON to compare against, written by benchmark.py --output')
+    parser.add_argument('--current', default=None,
+                        help='compare this benchmark JSON instead of running the benchmarks again')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='relative slowdown allowed per metric (0.1 is 10%%)')
+    parser.add_argument('--min-time', type=float, default=0.05,
+                        help='ignore phase time changes smaller than this many milliseconds per step')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='run the benchmarks this many times, keeping the best of each')
+    parser.add_argument('--regressions-only', action='store_true',
+                        help='only list the regressed metrics')
+    parser.add_argument('--update', action='store_true',
+                        help='store the new results as the baseline instead of failing')
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    if args.current is not None:
+        with open(args.current) as f:
+            current = json.load(f)
+    else:
+        def log(result):
+            print >> sys.stderr, format_result(result)
+        current = rerun(baseline, args.repeat, log)
+
+    rows = compare(baseline, current, args.tolerance, args.min_time / 1000.0)
+    print format_table(rows, args.regressions_only)
+
+    if args.update:
+        with open(args.baseline, 'w') as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+        sys.exit(0)
+
+    regressions = sum(1 for row in rows if row[-1])
+    if regressions:
+        print '%d regression(s) beyond %.0f%% of %s (revision %s)' % (
+            regressions, args.tolerance * 100, args.baseline, baseline['environment'].get('revision'))
+        sys.exit(1)
@@ -0,0 +1,4 @@
+from social_force import neighbor_pairs, pairwise_social_forces, social_forces
+from forces import advance_waypoints, desired_forces, obstacle_forces, field_obstacle_forces
+from state import CrowdState
+from domain import DomainDecomposition
@@ -0,0 +1,175 @@
+# spatial domain decomposition of a crowd over worker processes
+
+import multiprocessing
+import os
+
+import numpy as np
+
+from spatial import SpatialHash
+from utils import NEIGHBOR_RADIUS, SCALE, STEP_STATS, memory_in_use
+
+
+class _TileEnvironment(object):
+    """ The parts of a World a batch controller needs, rebuilt inside
+        every worker process
+    """
+    def __init__(self, obstacles, obstacle_field, obstacle_geometry, radius, cell_size):
+        self.obstacles = obstacles
+        self.obstacle_field = obstacle_field
+        self.obstacle_geometry = obstacle_geometry
+        self.radius = radius
+        self.agent_index = SpatialHash(cell_size)
+
+        # counts of the work done by the last tile step (see
+        # World.step_stats), neighbors are only counted for the rows
+        # in owned so that halo agents are not counted twice
+        self.step_stats = dict.fromkeys(STEP_STATS, 0)
+        self.owned = None
+
+    def agent_neighbor_pairs(self, positions, radius=None):
+        self.agent_index.build(positions)
+        pairs = self.agent_index.neighbor_pairs(self.radius if radius is None else radius)
+
+        stats = self.step_stats
+        stats['neighbors_examined'] += self.agent_index.pairs_examined
+        counts = np.bincount(pairs[0], minlength=len(positions))
+        if self.owned is not None:
+            counts = counts[self.owned]
+        stats['neighbors_found'] += int(counts.sum())
+        if len(counts):
+            stats['max_neighbors'] = max(stats['max_neighbors'], int(counts.max()))
+        return pairs
+
+
+# per process state of the workers, set up by _init_worker
+_worker = dict()
+
+
+def _init_worker(controller_class, settings, environment):
+    _worker['controller'] = controller_class(environment)
+    _worker['controller'].__dict__.update(settings)
+
+
+def _step_tile(task):
+    """ Step one tile: its own agents plus the halo around it. Only the
+        rows of the tile's own agents are sent back, halo agents miss
+        the neighbors on their far side and are stepped by their own
+        tile instead. The counts of the work done and the memory in use
+        by the worker go along
+    """
+    tile_state, owned, delta_time = task
+    environment = _worker['controller'].environment
+    environment.step_stats = dict.fromkeys(STEP_STATS, 0)
+    environment.owned = owned
+    _worker['controller'].drive_batch(tile_state, delta_time)
+    return tile_state.mutable_rows(owned), environment.step_stats, (os.getpid(), memory_in_use())
+
+
+class DomainDecomposition(object):
+    """ Steps a single crowd over several processes. The field is cut
+        into a grid of tiles; every step each worker gets the agents of
+        one tile along with the halo of agents from neighboring tiles
+        within the interaction radius of its border, so that forces are
+        the same as when stepping the whole crowd at once (batch mode).
+        Workers keep their own copy of the obstacles, but nothing else
+        survives from one step to the next in them: agents move between
+        tiles, so controllers keeping per-agent state of their own in
+        drive_batch (see Controller.batch_state) cannot be used.
+    """
+    def __init__(self, world, tiles, processes=None):
+        """
+            world:
+                the World to step, its obstacles should be compiled
+                (see World.compile_obstacles) before this is created
+            tiles:
+                (columns, rows) of the tile grid over the field
+            processes:
+                number of worker processes, defaults to one per core
+        """
+        if world.controller.batch_state:
+            raise ValueError('%s keeps per-agent state between steps and cannot be split over tiles'
+                             % type(world.controller).__name__)
+
+        self.tiles = tiles
+        self.radius = NEIGHBOR_RADIUS
+        self.bounds = (world.field_rect.left / SCALE, world.field_rect.top / SCALE,
+                       world.field_rect.right / SCALE, world.field_rect.bottom / SCALE)
+
+        # a tile narrower than its halo is mostly stepping its neighbors'
+        # agents, splitting any finer only adds work
+        left, top, right, bottom = self.bounds
+        width, height = (right - left) / tiles[0], (bottom - top) / tiles[1]
+        if min(width, height) < self.radius:
+            raise ValueError('%dx%d tiles of %.2fx%.2f m are narrower than their %.2f m halo, use fewer tiles'
+                             % (tiles[0], tiles[1], width, height, self.radius))
+
+        # the controller's own settings (force factors, ...) go along
+        settings = dict((key, value) for key, value in vars(world.controller).iteritems()
+                        if key != 'environment')
+        environment = _TileEnvironment(world.obstacles, world.obstacle_field, world.obstacle_geometry,
+                                       self.radius, world.agent_index.cell_size)
+        # counts of the work done by the last step, over all tiles
+        self.step_stats = dict.fromkeys(STEP_STATS, 0)
+        # resident memory of every worker in bytes, by process id, as of
+        # the last tile it stepped
+        self.worker_memory = dict()
+
+        self.pool = multiprocessing.Pool(processes, initializer=_init_worker,
+                                         initargs=(type(world.controller), settings, environment))
+
+    def tile_of(self, positions):
+        """ Column and row of the tile owning each of the (n, 2) positions
+            (agents outside the field belong to the closest border tile)
+        """
+        left, top, right, bottom = self.bounds
+        columns, rows = self.tiles
+        col = np.floor((positions[:, 0] - left) / (right - left) * columns).astype(np.intp)
+        row = np.floor((positions[:, 1] - top) / (bottom - top) * rows).astype(np.intp)
+        return np.clip(col, 0, columns - 1), np.clip(row, 0, rows - 1)
+
+    def _tasks(self, state, delta_time):
+        left, top, right, bottom = self.bounds
+        columns, rows = self.tiles
+        width, height = (right - left) / columns, (bottom - top) / rows
+        x, y = state.positions[:, 0], state.positions[:, 1]
+        col, row = self.tile_of(state.positions)
+
+        tasks, owners = [], []
+        for c in xrange(columns):
+            for r in xrange(rows):
+                owned = (col == c) & (row == r)
+                if not owned.any():
+                    continue
+
+                # tiles on the border of the field also own whatever is
+                # beyond it, so their halo extends to infinity there
+                x0 = -np.inf if c == 0 else left + c * width - self.radius
+                x1 = np.inf if c == columns - 1 else left + (c + 1) * width + self.radius
+                y0 = -np.inf if r == 0 else top + r * height - self.radius
+                y1 = np.inf if r == rows - 1 else top + (r + 1) * height + self.radius
+                near = (x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)
+
+                # rows stay in global order, so results match batch mode
+                local = np.nonzero(owned | near)[0]
+                tasks.append((state.subset(local), owned[local], delta_time))
+                owners.append(local[owned[local]])
+
+        return tasks, owners
+
+    def step(self, state, delta_time):
+        """ Drive the (already confined) crowd state over a single step
+        """
+        tasks, owners = self._tasks(state, delta_time)
+        stats = self.step_stats = dict.fromkeys(STEP_STATS, 0)
+        for rows, (values, tile_stats, (pid, memory)) in zip(owners, self.pool.map(_step_tile, tasks)):
+            state.update_rows(rows, values)
+            self.worker_memory[pid] = memory
+            for name, count in tile_stats.iteritems():
+                if name == 'max_neighbors':
+                    stats[name] = max(stats[name], count)
+                else:
+                    stats[name] += count
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
@@ -0,0 +1,61 @@
+# vectorized desired (waypoint) and obstacle forces
+
+import numpy as np
+
+
+def _normalized(vectors):
+    """ Row-wise normalized (n, 2) vectors, zero rows stay zero
+    """
+    length = np.sqrt(vectors[:, 0]**2 + vectors[:, 1]**2)
+    length[length == 0] = 1.0
+    return vectors / length[:, None]
+
+
+def advance_waypoints(state):
+    """ Move every agent that is inside its current waypoint on to the
+        next one, wrapping around at the end of its route (see
+        Agent._compute_desired_force)
+    """
+    target = state.waypoint_positions[state.next_waypoint]
+    diff = state.positions - target
+    reached = np.sqrt(diff[:, 0]**2 + diff[:, 1]**2) <= state.waypoint_radii[state.next_waypoint]
+
+    state.waypoint_index[reached] += 1
+    state.waypoints_reached[reached] += 1
+    state.waypoint_index[state.waypoint_index == state.route_lengths] = 0
+    return reached
+
+
+def desired_forces(state):
+    """ Force driving every agent towards its current waypoint at its
+        maximum speed (see Waypoint.force_towards)
+    """
+    target = state.waypoint_positions[state.next_waypoint]
+    desired_velocity = state.vmax[:, None] * _normalized(target - state.positions)
+    return (desired_velocity - state.velocities) / state.relaxation_time[:, None]
+
+
+def obstacle_forces(positions, radius, distances, closest_points):
+    """ Repulsion from the closest obstacle point, given the distance to
+        it, for every agent (see Agent._compute_obstacle_force)
+    """
+    forces = np.zeros((len(positions), 2))
+    near = distances <= radius * 5
+    if not near.any():
+        return forces
+
+    force_amount = np.exp(-(distances[near] - radius[near]))
+    forces[near] = force_amount[:, None] * _normalized(positions[near] - closest_points[near])
+    return forces
+
+
+def field_obstacle_forces(radius, distances, gradients):
+    """ Same as obstacle_forces, from a distance field lookup (distance
+        and unit direction away from the obstacle)
+    """
+    forces = np.zeros((len(distances), 2))
+    near = distances <= radius * 5
+
+    force_amount = np.exp(-(distances[near] - radius[near]))
+    forces[near] = force_amount[:, None] * gradients[near]
+    return forces
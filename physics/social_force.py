@@ -0,0 +1,111 @@
+# vectorized (struct-of-arrays) social force kernel
+
+import numpy as np
+
+
+# variables according to Moussaid-Helbing paper (same values as
+# Agent._compute_social_force, keep them in sync)
+LAMBDA_IMPORTANCE = 2.0
+GAMMA = 0.35
+N, N_PRIME = 2, 3
+
+# rows of the distance matrix handled at once by neighbor_pairs, this
+# bounds the temporary memory to BLOCK_ROWS x n_agents
+BLOCK_ROWS = 256
+
+
+def neighbor_pairs(positions, dist_range):
+    """ Brute force neighbor search over a (n, 2) array of positions.
+        Return two index arrays (i, j) holding every ordered pair of
+        distinct agents with |p_j - p_i| <= dist_range, sorted by i
+        and then j (the same order Agent._neighbors is built in)
+    """
+    positions = np.asarray(positions, dtype=np.float64)
+    n = len(positions)
+    rows, cols = [], []
+
+    for start in xrange(0, n, BLOCK_ROWS):
+        block = positions[start:start + BLOCK_ROWS]
+        dx = positions[None, :, 0] - block[:, None, 0]
+        dy = positions[None, :, 1] - block[:, None, 1]
+        within = np.sqrt(dx**2 + dy**2) <= dist_range
+
+        # no pairs with oneself
+        idx = np.arange(len(block))
+        within[idx, start + idx] = False
+
+        i, j = np.nonzero(within)
+        rows.append(i + start)
+        cols.append(j)
+
+    if not rows:
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+
+    return np.concatenate(rows), np.concatenate(cols)
+
+
+def pairwise_social_forces(positions, velocities, i, j):
+    """ Social force (Moussaid-Helbing) exerted on every agent by the
+        agents it is paired with.
+
+        positions, velocities:
+            (n, 2) arrays, in metres and m/s
+        i, j:
+            index arrays, agent i feels the force of agent j
+
+        Returns a (n, 2) array with the summed force per agent
+    """
+    positions = np.asarray(positions, dtype=np.float64)
+    velocities = np.asarray(velocities, dtype=np.float64)
+    n = len(positions)
+    forces = np.zeros((n, 2))
+    if len(i) == 0:
+        return forces
+
+    # position difference
+    diff = positions[j] - positions[i]
+    dist = np.sqrt(diff[:, 0]**2 + diff[:, 1]**2)
+    diff_direction = diff.copy()
+    moved = dist != 0
+    diff_direction[moved] /= dist[moved, None]
+
+    # velocity difference
+    vel_diff = velocities[i] - velocities[j]
+
+    # interaction direction t_ij, pairs without one exert no force
+    interaction_vector = LAMBDA_IMPORTANCE * vel_diff + diff_direction
+    interaction_length = np.sqrt(interaction_vector[:, 0]**2 + interaction_vector[:, 1]**2)
+    valid = interaction_length != 0
+    if not valid.all():
+        i, dist, diff_direction = i[valid], dist[valid], diff_direction[valid]
+        interaction_vector, interaction_length = interaction_vector[valid], interaction_length[valid]
+
+    interaction_direction = interaction_vector / interaction_length[:, None]
+    ix, iy = interaction_direction[:, 0], interaction_direction[:, 1]
+    dx, dy = diff_direction[:, 0], diff_direction[:, 1]
+
+    # theta (angle between interaction direction and position difference vector)
+    theta = np.arctan2(ix*dy - iy*dx, ix*dx + iy*dy)
+
+    # model parameter B = gamma * ||D||
+    B = GAMMA * interaction_length
+
+    force_vel_amount = -np.exp(-dist / B - (N_PRIME * B * theta)**2)
+    force_angle_amount = np.where(theta < 0.0, 1.0, -1.0) * np.exp(-dist / B - (N * B * theta)**2)
+
+    # force_vel along t_ij, force_angle along its left normal
+    fx = force_vel_amount * ix - force_angle_amount * iy
+    fy = force_vel_amount * iy + force_angle_amount * ix
+
+    forces[:, 0] = np.bincount(i, weights=fx, minlength=n)
+    forces[:, 1] = np.bincount(i, weights=fy, minlength=n)
+
+    return forces
+
+
+def social_forces(positions, velocities, dist_range):
+    """ Social force on every agent from all agents within dist_range,
+        the batch equivalent of Agent.social_move's social force
+    """
+    i, j = neighbor_pairs(positions, dist_range)
+    return pairwise_social_forces(positions, velocities, i, j)
@@ -0,0 +1,179 @@
+# struct-of-arrays view of a crowd
+
+import numpy as np
+
+from utils import SCALE, vec2d
+
+
+class CrowdState(object):
+    """ Whole-crowd state as flat arrays (one row per agent), for the
+        batch (vectorized) controllers. Agent k of the state is
+        self.agents[k]; load() and store() copy between the arrays and
+        the Agent entities.
+
+        Positions and waypoints are in metres, velocities in m/s.
+    """
+
+    # per agent arrays, and the ones among them that change when stepping
+    ROWS = ('ids', 'types', 'vmax', 'radius', 'relaxation_time', 'routes', 'route_lengths',
+            'positions', 'prev_positions', 'velocities', 'directions', 'waypoint_index',
+            'waypoints_reached', 'social_force', 'desired_force', 'obstacle_force', 'lookahead_force')
+    MUTABLE_ROWS = ('positions', 'prev_positions', 'velocities', 'directions', 'waypoint_index',
+                    'waypoints_reached', 'social_force', 'desired_force', 'obstacle_force',
+                    'lookahead_force')
+
+    def __init__(self, agents):
+        self.agents = list(agents)
+        n = len(self.agents)
+
+        self.ids = np.array([agent.id for agent in self.agents], dtype=np.intp)
+        self.types = np.array([agent._type for agent in self.agents], dtype=np.intp)
+        self.vmax = np.array([agent.vmax for agent in self.agents], dtype=np.float64)
+        self.radius = np.array([agent.radius for agent in self.agents], dtype=np.float64)
+        self.relaxation_time = np.array([agent.relaxation_time for agent in self.agents], dtype=np.float64)
+
+        # waypoints shared by all agents, routes index into them
+        self.waypoints = []
+        slots = dict()
+        routes = []
+        for agent in self.agents:
+            route = []
+            for waypoint in agent._waypoints:
+                if id(waypoint) not in slots:
+                    slots[id(waypoint)] = len(self.waypoints)
+                    self.waypoints.append(waypoint)
+                route.append(slots[id(waypoint)])
+            routes.append(route)
+
+        self.waypoint_positions = np.array([wp.position for wp in self.waypoints], dtype=np.float64).reshape(-1, 2)
+        self.waypoint_radii = np.array([wp.radius for wp in self.waypoints], dtype=np.float64)
+        self.route_lengths = np.array([len(route) for route in routes], dtype=np.intp)
+        self.routes = np.zeros((n, max([1] + self.route_lengths.tolist())), dtype=np.intp)
+        for k, route in enumerate(routes):
+            self.routes[k, :len(route)] = route
+
+        self.positions = np.zeros((n, 2))
+        self.prev_positions = np.zeros((n, 2))
+        self.velocities = np.zeros((n, 2))
+        self.directions = np.zeros((n, 2))
+        self.waypoint_index = np.zeros(n, dtype=np.intp)
+
+        # waypoints reached since the state was created (the agents do
+        # not keep count, so load() and store() leave it alone)
+        self.waypoints_reached = np.zeros(n, dtype=np.intp)
+
+        self.social_force = np.zeros((n, 2))
+        self.desired_force = np.zeros((n, 2))
+        self.obstacle_force = np.zeros((n, 2))
+        self.lookahead_force = np.zeros((n, 2))
+
+        self.load()
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def stack(states):
+        """ A single state holding the rows of all the given states one
+            after the other. The states should come from the same scene
+            (same waypoints along the same routes), the waypoints of the
+            first one are kept
+        """
+        whole = CrowdState.__new__(CrowdState)
+        whole.agents = [agent for state in states for agent in state.agents]
+        whole.waypoints = states[0].waypoints
+        whole.waypoint_positions = states[0].waypoint_positions
+        whole.waypoint_radii = states[0].waypoint_radii
+
+        for name in CrowdState.ROWS:
+            setattr(whole, name, np.concatenate([getattr(state, name) for state in states]))
+        return whole
+
+    def subset(self, rows):
+        """ A detached copy of the given rows (an index array or mask).
+            It shares the waypoint arrays but has no agents or waypoint
+            entities, so it is cheap to send to other processes
+        """
+        part = CrowdState.__new__(CrowdState)
+        part.agents = None
+        part.waypoints = None
+        part.waypoint_positions = self.waypoint_positions
+        part.waypoint_radii = self.waypoint_radii
+
+        for name in self.ROWS:
+            setattr(part, name, getattr(self, name)[rows])
+        return part
+
+    def mutable_rows(self, rows=slice(None)):
+        """ The arrays that stepping changes, restricted to rows, as a
+            dict (see update_rows)
+        """
+        return dict((name, getattr(self, name)[rows]) for name in self.MUTABLE_ROWS)
+
+    def update_rows(self, rows, values):
+        """ Write back arrays returned by mutable_rows() into rows
+        """
+        for name, value in values.iteritems():
+            getattr(self, name)[rows] = value
+
+    def load(self):
+        """ Copy the kinematic state of the agents into the arrays
+        """
+        for k, agent in enumerate(self.agents):
+            self.positions[k] = agent._position.x, agent._position.y
+            self.prev_positions[k] = agent.prev_pos.x, agent.prev_pos.y
+            self.velocities[k] = agent._velocity.x, agent._velocity.y
+            self.directions[k] = agent._direction.x, agent._direction.y
+            self.waypoint_index[k] = agent._waypoint_index
+
+            self.social_force[k] = tuple(agent._social_force)
+            self.desired_force[k] = tuple(agent._desired_force)
+            self.obstacle_force[k] = tuple(agent._obstacle_force)
+            self.lookahead_force[k] = tuple(agent._lookahead_force)
+
+    def store(self):
+        """ Copy the arrays back into the agents
+        """
+        rows = zip(self.agents, self.positions.tolist(), self.prev_positions.tolist(),
+                   self.velocities.tolist(), self.directions.tolist(), self.waypoint_index.tolist(),
+                   self.social_force.tolist(), self.desired_force.tolist(),
+                   self.obstacle_force.tolist(), self.lookahead_force.tolist())
+
+        for agent, pos, prev, vel, direction, wp_index, social, desired, obstacle, lookahead in rows:
+            agent._position = vec2d(pos)
+            agent.prev_pos = vec2d(prev)
+            agent._velocity = vec2d(vel)
+            agent._direction = vec2d(direction)
+            agent._waypoint_index = wp_index
+
+            agent._social_force = vec2d(social)
+            agent._desired_force = vec2d(desired)
+            agent._obstacle_force = vec2d(obstacle)
+            agent._lookahead_force = vec2d(lookahead)
+
+    @property
+    def next_waypoint(self):
+        """ Index (into self.waypoints) of every agent's current waypoint
+        """
+        return self.routes[np.arange(len(self)), self.waypoint_index]
+
+    def confine(self, bounds):
+        """ Batch version of Agent.update: point the direction along the
+            velocity and push agents that left the field (a pixel rect)
+            back onto its border, bouncing their direction
+        """
+        self.directions[:, 0] = self.velocities[:, 0]
+        self.directions[:, 1] = -self.velocities[:, 1]
+
+        x, y = self.positions[:, 0] * SCALE, self.positions[:, 1] * SCALE
+        pending = np.ones(len(self), dtype=bool)
+
+        # only the first violated border is handled, like Agent.update
+        for axis, outside, border in ((0, x < bounds.left, bounds.left),
+                                      (0, x > bounds.right, bounds.right),
+                                      (1, y < bounds.top, bounds.top),
+                                      (1, y > bounds.bottom, bounds.bottom)):
+            hit = pending & outside
+            self.positions[hit, axis] = border / SCALE
+            self.directions[hit, axis] *= -1
+            pending &= ~outside
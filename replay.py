@@ -0,0 +1,140 @@
+import pygame
+
+from crowdsim import Simulation
+from iosystem import TrajectoryReader
+from utils import vec2d
+
+
+class Replay(Simulation):
+    """
+    Plays back a recorded trajectory file (see World.record_trajectory)
+    in the viewer, without simulating anything. The scene provides the
+    waypoints, obstacles and agents to draw; the agents are moved to
+    the recorded frames.
+
+    Playback follows the simulated time the frames were taken at, so
+    recordings missing some steps (see iosystem.BackgroundWriter) play
+    at the right speed, holding each frame until the next one is due.
+    Frames are read from the file (memory mapped) only when drawn, so
+    fast playback skips over the frames in between.
+
+    keys:
+        space pauses, 1/2/3 play at 1x, 2x and 10x, [ and ] halve and
+        double the speed, left/right seek 10 s, page up/down 60 s,
+        home/end go to the start/end, , and . step one frame back or
+        forward
+    """
+
+    SPEEDS = {pygame.K_1: 1.0, pygame.K_2: 2.0, pygame.K_3: 10.0}
+
+    # seconds to skip when seeking
+    SEEK_SHORT, SEEK_LONG = 10.0, 60.0
+
+    def __init__(self, trajectory, params=None, render_every=1, max_fps=60, speed=1.0):
+        """ Create the replay viewer
+
+            trajectory:
+                file written by iosystem.TrajectoryRecorder
+            params, render_every, max_fps, speed:
+                see Simulation
+        """
+        self.trajectory = TrajectoryReader(trajectory)
+        self.STEP_SIZE = self.trajectory.dt
+        Simulation.__init__(self, params, render_every, max_fps, speed)
+
+        # frames are cheap to skip, allow catching up by up to 10 s per update
+        self.scheduler.max_steps_per_frame = max(5, int(round(10.0 / self.STEP_SIZE)))
+
+        self.frame = 0
+        self._shown_frame = None
+        self.sim_time = self.trajectory.start_time
+        self.seek(0)
+
+    def simulation_update(self):
+        # only the clock moves on, the frame is read when it is drawn
+        if len(self.trajectory) > 0 and self.sim_time < self.trajectory.time(len(self.trajectory) - 1):
+            self.seek_to(self.sim_time + self.STEP_SIZE)
+        else:
+            self.paused = True
+        self._steps_since_render += 1
+
+    def seek(self, frame):
+        """ Jump to the given frame (clamped to the recording)
+        """
+        if len(self.trajectory) == 0:
+            return
+        self.frame = max(0, min(frame, len(self.trajectory) - 1))
+        self.step_count = self.trajectory.step(self.frame)
+        self.sim_time = self.trajectory.time(self.frame)
+
+    def seek_to(self, time):
+        """ Jump to the given simulated time (clamped to the recording),
+            showing the last frame taken by then
+        """
+        if len(self.trajectory) == 0:
+            return
+        first, last = self.trajectory.time(0), self.trajectory.time(len(self.trajectory) - 1)
+        self.sim_time = max(first, min(time, last))
+        # times add up the same way as when recording, but leave room
+        # for rounding so that a frame shows at its own time
+        self.frame = self.trajectory.frame_at(self.sim_time + self.STEP_SIZE * 1e-6)
+        self.step_count = self.trajectory.step(self.frame)
+
+    def seek_time(self, seconds):
+        """ Jump by the given (possibly negative) simulated time
+        """
+        self.seek_to(self.sim_time + seconds)
+        self._steps_since_render = self.render_every
+
+    def _jump(self, frame):
+        # seek and show the frame right away, even when paused
+        self.seek(frame)
+        self._steps_since_render = self.render_every
+
+    def load_frame(self, k):
+        """ Move the agents to their state in frame k
+        """
+        if len(self.agents) != self.trajectory.agents:
+            raise ValueError('the recording holds %d agents, the scene %d' %
+                             (self.trajectory.agents, len(self.agents)))
+
+        for agent, record in zip(self.agents, self.trajectory[k].tolist()):
+            x, y, vx, vy, waypoint = record[:5]
+            agent._position = vec2d(x, y)
+            agent._velocity = vec2d(vx, vy)
+            agent._direction = vec2d(vx, -vy)
+            agent._waypoint_index = int(waypoint)
+
+            agent._social_force = vec2d(record[5:7])
+            agent._desired_force = vec2d(record[7:9])
+            agent._obstacle_force = vec2d(record[9:11])
+            agent._lookahead_force = vec2d(record[11:13])
+        self._shown_frame = k
+
+    def draw(self):
+        if len(self.trajectory) > 0 and self._shown_frame != self.frame:
+            self.load_frame(self.frame)
+        Simulation.draw(self)
+
+    def _process_key(self, key):
+        if key in self.SPEEDS:
+            self.scheduler.speed = self.SPEEDS[key]
+            self.scheduler.accumulator = 0.0
+        elif key == pygame.K_LEFT:
+            self.seek_time(-self.SEEK_SHORT)
+        elif key == pygame.K_RIGHT:
+            self.seek_time(self.SEEK_SHORT)
+        elif key == pygame.K_PAGEDOWN:
+            self.seek_time(-self.SEEK_LONG)
+        elif key == pygame.K_PAGEUP:
+            self.seek_time(self.SEEK_LONG)
+        elif key == pygame.K_HOME:
+            self._jump(0)
+        elif key == pygame.K_END:
+            self._jump(len(self.trajectory) - 1)
+        elif key == pygame.K_COMMA:
+            self._jump(self.frame - 1)
+        elif key == pygame.K_PERIOD:
+            self._jump(self.frame + 1)
+        else:
+            Simulation._process_key(self, key)
@@ -1,24 +1,168 @@
+import argparse
 
-from crowdsim import Simulation
-from iosystem import SceneIO
+from iosystem import open_scene, BACKPRESSURE
 
 from pprint import pprint
 
 
-def start_main_simulation(params):
-    sim = Simulation(params)
+def load_scene(world, sio, obstacles='scan', batch=False, tiles=None, verlet_skin=None):
+    world.add_waypoints(waypoint_dict=sio.get_waypoints())
+    world.add_obstacles(obstacle_dict=sio.get_obstacles())
+    world.add_agents(agent_dict=sio.get_agents())
+    if obstacles != 'scan':
+        world.compile_obstacles(method=obstacles)
+    world.use_batch_mode(batch)
+    if verlet_skin is not None:
+        world.use_verlet_lists(verlet_skin)
+    if tiles is not None:
+        world.use_domain_decomposition(tiles)
+    return world
+
+
+def start_main_simulation(sio, obstacles='scan', batch=False, render_every=1, max_fps=60, speed=10.0,
+                          record=None, backpressure='block', trace=None, metrics=None, metrics_port=None,
+                          metrics_interval=10.0, verlet_skin=None):
+    # the viewer needs pygame, only import it when we actually want a window
+    from crowdsim import Simulation
+
+    sim = Simulation(params=sio.get_parameters(), render_every=render_every, max_fps=max_fps,
+                     speed=speed)
+    load_scene(sim, sio, obstacles, batch, verlet_skin=verlet_skin)
+    if record is not None:
+        sim.record_trajectory(record, backpressure)
+    if trace is not None:
+        sim.trace(trace)
+    if metrics is not None or metrics_port is not None:
+        sim.monitor(metrics, metrics_port, metrics_interval)
+
+    print sio.get_field_size()
+
     sim.run()
 
 
+def start_replay(sio, trajectory, render_every=1, max_fps=60, speed=1.0):
+    from replay import Replay
+
+    replay = Replay(trajectory, params=sio.get_parameters(), render_every=render_every,
+                    max_fps=max_fps, speed=speed)
+    load_scene(replay, sio)
+    replay.run()
+
+
+def start_headless_simulation(sio, n_steps, obstacles='scan', batch=False, tiles=None, record=None,
+                              backpressure='block', restore=None, checkpoint=None, profile=False,
+                              trace=None, metrics=None, metrics_port=None, metrics_interval=10.0,
+                              verlet_skin=None):
+    from world import World
+
+    if restore is not None:
+        world = World.from_checkpoint(restore)
+        if verlet_skin is not None:
+            world.use_verlet_lists(verlet_skin)
+        if tiles is not None:
+            world.use_domain_decomposition(tiles)
+    else:
+        world = load_scene(World(params=sio.get_parameters()), sio, obstacles, batch, tiles, verlet_skin)
+    if record is not None:
+        world.record_trajectory(record, backpressure)
+    if profile:
+        world.profiler.enable()
+    if trace is not None:
+        world.trace(trace)
+    if metrics is not None or metrics_port is not None:
+        world.monitor(metrics, metrics_port, metrics_interval)
+    world.run(n_steps)
+    world.stop_monitoring()
+    world.stop_tracing()
+    world.profiler.disable()
+    world.stop_recording()
+    world.sync_agents()
+    world.use_domain_decomposition(None)
+    if checkpoint is not None:
+        world.save_checkpoint(checkpoint)
+
+    print 'simulated %d steps (%.1f s)' % (world.step_count, world.sim_time)
+    if world.agent_verlet is not None:
+        print 'neighbor lists rebuilt %d times' % world.agent_verlet.rebuilds
+    if profile:
+        print world.profiler.format_table()
+    return world
+
+
 if __name__ == '__main__':
-    sio = SceneIO('scenes/square_room.xml')
+    parser = argparse.ArgumentParser(description='Run a crowd simulation scene')
+    parser.add_argument('scene', nargs='?', default='scenes/square_room.xml',
+                        help='scene file to load')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='parse the scene file even when its compiled form is cached')
+    parser.add_argument('--headless', action='store_true',
+                        help='run without opening a pygame window')
+    parser.add_argument('--steps', type=int, default=1000,
+                        help='number of steps to simulate when headless')
+    parser.add_argument('--obstacles', choices=('scan', 'field', 'exact', 'tree'), default='scan',
+                        help='obstacle force lookup: scan every obstacle, precomputed '
+                             'distance field, compiled exact geometry or AABB tree')
+    parser.add_argument('--batch', action='store_true',
+                        help='step the whole crowd at once (vectorized controllers)')
+    parser.add_argument('--verlet-skin', type=float, default=None, metavar='METRES',
+                        help='cache the neighbors within the interaction radius plus this skin '
+                             '(Verlet lists) instead of searching them every step')
+    parser.add_argument('--tiles', type=int, nargs=2, metavar=('COLUMNS', 'ROWS'),
+                        help='split the field into tiles stepped by worker processes '
+                             '(headless only, implies --batch)')
+    parser.add_argument('--record', default=None, metavar='FILE',
+                        help='record the trajectories to a binary file')
+    parser.add_argument('--restore', default=None, metavar='FILE',
+                        help='start from a checkpoint instead of the scene (headless only)')
+    parser.add_argument('--checkpoint', default=None, metavar='FILE',
+                        help='save a checkpoint of the final state (headless only)')
+    parser.add_argument('--replay', default=None, metavar='FILE',
+                        help='play back a recorded trajectory file of the scene instead of '
+                             'simulating it')
+    parser.add_argument('--backpressure', choices=BACKPRESSURE, default='block',
+                        help='what to do when recording falls behind the simulation: wait, '
+                             'drop frames or only keep some of them')
+    parser.add_argument('--profile', action='store_true',
+                        help='time the phases of the steps and print them at the end (headless '
+                             'only, press p in the window)')
+    parser.add_argument('--trace', default=None, metavar='FILE',
+                        help='write a timeline of the frames and steps to a Chrome trace file '
+                             '(chrome://tracing, ui.perfetto.dev)')
+    parser.add_argument('--metrics', default=None, metavar='FILE',
+                        help='keep writing live metrics of the run to a file, in the Prometheus '
+                             'text format')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='serve the live metrics on this localhost port')
+    parser.add_argument('--metrics-interval', type=float, default=10.0,
+                        help='seconds between writes of the metrics file')
+    parser.add_argument('--render-every', type=int, default=1,
+                        help='draw at most once every N simulation steps')
+    parser.add_argument('--max-fps', type=int, default=60,
+                        help='draw at most this many frames per second (0 for no limit)')
+    parser.add_argument('--speed', type=float, default=None,
+                        help='simulated seconds per wall clock second (0 for as fast as possible), '
+                             'defaults to 10 in the viewer and 1 when replaying')
+    args = parser.parse_args()
+    if args.restore is not None and not args.headless:
+        parser.error('--restore only works with --headless')
+
+    # a checkpoint holds the whole scene, no need to parse it again
+    sio = open_scene(args.scene, cache=not args.no_cache) if args.restore is None else None
     # pprint(sio.get_waypoints())
-    
-    sim = Simulation(params=sio.get_parameters())
-    sim.add_waypoints(waypoint_dict=sio.get_waypoints())
-    sim.add_obstacles(obstacle_dict=sio.get_obstacles())
-    sim.add_agents(agent_dict=sio.get_agents())
 
-    print sio.get_field_size()
+    speed = args.speed
+    if speed is None:
+        speed = 1.0 if args.replay is not None else 10.0
 
-    sim.run()
\ No newline at end of file
+    if args.replay is not None:
+        start_replay(sio, args.replay, args.render_every, args.max_fps or None, speed or None)
+    elif args.headless:
+        start_headless_simulation(sio, args.steps, args.obstacles, args.batch, args.tiles,
+                                  args.record, args.backpressure, args.restore, args.checkpoint,
+                                  args.profile, args.trace, args.metrics, args.metrics_port,
+                                  args.metrics_interval, args.verlet_skin)
+    else:
+        start_main_simulation(sio, args.obstacles, args.batch,
+                              args.render_every, args.max_fps or None, speed or None,
+                              args.record, args.backpressure, args.trace, args.metrics,
+                              args.metrics_port, args.metrics_interval, args.verlet_skin)
@@ -0,0 +1,5 @@
+from spatial_hash import SpatialHash
+from verlet_list import VerletList
+from distance_field import DistanceField
+from segments import ObstacleGeometry, compile_obstacles
+from aabb_tree import AABBTree
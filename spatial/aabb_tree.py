@@ -0,0 +1,219 @@
+# bounding volume hierarchy (AABB tree) over the scene obstacles
+
+from heapq import heappush, heappop
+from math import sqrt
+
+import numpy as np
+
+from segments import compile_obstacles
+
+
+# maximum number of primitives (segments, circles) held by a leaf
+LEAF_SIZE = 4
+
+
+def _segment_distance(segment, x, y):
+    """ Distance and closest point from (x, y) to a segment (clamped to
+        its end points)
+    """
+    x1, y1, x2, y2 = segment
+    sx, sy = x2 - x1, y2 - y1
+    length_sqrd = sx*sx + sy*sy
+    u = 0.0 if length_sqrd == 0 else min(1.0, max(0.0, ((x - x1)*sx + (y - y1)*sy) / length_sqrd))
+    px, py = x1 + u*sx, y1 + u*sy
+    return sqrt((x - px)**2 + (y - py)**2), (px, py)
+
+
+def _circle_distance(circle, x, y):
+    """ Signed distance and closest point from (x, y) to a circle rim
+    """
+    cx, cy, r = circle
+    dx, dy = x - cx, y - cy
+    norm = sqrt(dx*dx + dy*dy)
+    if norm == 0:
+        dx, dy, norm = 1.0, 0.0, 1.0
+    return norm - r, (cx + dx / norm * r, cy + dy / norm * r)
+
+
+def _box_distance(box, x, y):
+    """ Distance from (x, y) to an axis aligned box (0 inside)
+    """
+    dx = max(box[0] - x, 0.0, x - box[2])
+    dy = max(box[1] - y, 0.0, y - box[3])
+    return sqrt(dx*dx + dy*dy)
+
+
+class AABBTree(object):
+    """ Axis aligned bounding box tree over the segments and circles
+        making up the obstacles (see compile_obstacles). Answers "which
+        obstacles are within r of a point" and "closest obstacle point"
+        by only visiting the branches whose boxes are in reach.
+
+        When obstacles move without being added or removed, refit()
+        updates the boxes in place; otherwise call rebuild().
+    """
+    def __init__(self, obstacles):
+        self.rebuild(obstacles)
+
+    def __len__(self):
+        return len(self._primitives)
+
+    def _compile(self, obstacles):
+        segments, circles, segment_owner, circle_owner = compile_obstacles(obstacles)
+
+        self._primitives = [(_segment_distance, tuple(s)) for s in segments.tolist()] + \
+                           [(_circle_distance, tuple(c)) for c in circles.tolist()]
+        self._owners = segment_owner.tolist() + circle_owner.tolist()
+
+        # signed circle distances go down to -r inside the circle, box
+        # distances minus this slack are lower bounds on them
+        self._slack = np.zeros(len(self._primitives))
+        self._slack[len(segments):] = circles[:, 2]
+
+        boxes = np.zeros((len(self._primitives), 4))
+        if len(segments):
+            boxes[:len(segments)] = np.column_stack((
+                np.minimum(segments[:, 0], segments[:, 2]), np.minimum(segments[:, 1], segments[:, 3]),
+                np.maximum(segments[:, 0], segments[:, 2]), np.maximum(segments[:, 1], segments[:, 3])))
+        if len(circles):
+            boxes[len(segments):] = np.column_stack((
+                circles[:, 0] - circles[:, 2], circles[:, 1] - circles[:, 2],
+                circles[:, 0] + circles[:, 2], circles[:, 1] + circles[:, 2]))
+        return boxes
+
+    def rebuild(self, obstacles):
+        """ Build the tree from scratch over the given obstacles
+        """
+        boxes = self._compile(obstacles)
+
+        # nodes are stored in flat lists, children always come after
+        # their parent (which refit relies on)
+        self._node_box = []
+        self._node_slack = []
+        self._node_children = []
+        self._node_items = []
+
+        if len(boxes):
+            self._build(boxes, np.arange(len(boxes)))
+
+    def _build(self, boxes, items):
+        node = len(self._node_box)
+        self._node_box.append(self._union(boxes[items]))
+        self._node_slack.append(float(self._slack[items].max()))
+        self._node_children.append(None)
+        self._node_items.append(None)
+
+        if len(items) <= LEAF_SIZE:
+            self._node_items[node] = items.tolist()
+            return node
+
+        # split at the median of the box centers along the widest axis
+        centers = (boxes[items, :2] + boxes[items, 2:]) / 2.0
+        axis = int(np.argmax(centers.max(axis=0) - centers.min(axis=0)))
+        half = len(items) // 2
+        order = np.argpartition(centers[:, axis], half)
+
+        left = self._build(boxes, items[order[:half]])
+        right = self._build(boxes, items[order[half:]])
+        self._node_children[node] = (left, right)
+        return node
+
+    def _union(self, boxes):
+        return (float(boxes[:, 0].min()), float(boxes[:, 1].min()),
+                float(boxes[:, 2].max()), float(boxes[:, 3].max()))
+
+    def refit(self, obstacles):
+        """ Update the boxes after obstacles have moved or changed size,
+            keeping the tree structure. The obstacles must compile to the
+            same primitives as when the tree was built
+        """
+        count = len(self._primitives)
+        boxes = self._compile(obstacles)
+        if len(boxes) != count:
+            raise ValueError('refit needs the same obstacles the tree was built with, use rebuild()')
+
+        for node in reversed(xrange(len(self._node_box))):
+            if self._node_children[node] is None:
+                self._node_box[node] = self._union(boxes[self._node_items[node]])
+                self._node_slack[node] = float(self._slack[self._node_items[node]].max())
+            else:
+                left, right = self._node_children[node]
+                self._node_slack[node] = max(self._node_slack[left], self._node_slack[right])
+                lbox, rbox = self._node_box[left], self._node_box[right]
+                self._node_box[node] = (min(lbox[0], rbox[0]), min(lbox[1], rbox[1]),
+                                        max(lbox[2], rbox[2]), max(lbox[3], rbox[3]))
+
+    def query(self, point, radius):
+        """ Indices (into the obstacle list) of all obstacles within
+            radius of point, sorted
+        """
+        x, y = point[0], point[1]
+        found = set()
+        stack = [0] if self._node_box else []
+
+        while stack:
+            node = stack.pop()
+            if _box_distance(self._node_box[node], x, y) - self._node_slack[node] > radius:
+                continue
+            if self._node_children[node] is not None:
+                stack.extend(self._node_children[node])
+                continue
+            for item in self._node_items[node]:
+                distance, primitive = self._primitives[item]
+                if distance(primitive, x, y)[0] <= radius:
+                    found.add(self._owners[item])
+
+        return sorted(found)
+
+    def _lower_bound(self, node, x, y):
+        """ Lower bound of the distance from (x, y) to anything in node
+        """
+        return _box_distance(self._node_box[node], x, y) - self._node_slack[node]
+
+    def nearest(self, point, max_distance=float('inf')):
+        """ Closest obstacle point to point, searched up to max_distance.
+            Returns (distance, (x, y), obstacle index), or
+            (inf, None, -1) when no obstacle is that close
+        """
+        x, y = point[0], point[1]
+        best = float('inf'), None, -1
+        if not self._node_box:
+            return best
+
+        # best first descent, ordered by distance to the node boxes
+        heap = [(self._lower_bound(0, x, y), 0)]
+        while heap:
+            bound, node = heappop(heap)
+            if bound > max_distance or bound >= best[0]:
+                break
+            if self._node_children[node] is not None:
+                for child in self._node_children[node]:
+                    heappush(heap, (self._lower_bound(child, x, y), child))
+                continue
+            for item in self._node_items[node]:
+                distance, primitive = self._primitives[item]
+                dist, closest = distance(primitive, x, y)
+                if dist < best[0] and dist <= max_distance:
+                    best = dist, closest, self._owners[item]
+
+        return best
+
+    def closest(self, point, max_distance=float('inf')):
+        """ Closest obstacle point as a (distance, (x, y)) pair, like
+            ObstacleGeometry.closest
+        """
+        dist, closest, _ = self.nearest(point, max_distance)
+        return dist, closest
+
+    def closest_points(self, points, max_distance=float('inf')):
+        """ Batch version of nearest() for an (n, 2) array of points,
+            returns distances (n,), closest points (n, 2) and obstacle
+            indices (n,) like ObstacleGeometry.closest_points
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        results = [self.nearest(p, max_distance) for p in points.tolist()]
+
+        distances = np.array([r[0] for r in results])
+        closest = np.array([r[1] if r[1] is not None else (np.nan, np.nan) for r in results]).reshape(-1, 2)
+        owners = np.array([r[2] for r in results], dtype=np.intp)
+        return distances, closest, owners
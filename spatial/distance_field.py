@@ -0,0 +1,164 @@
+# precomputed (rasterized) obstacle distance field
+
+from math import ceil, floor
+
+import numpy as np
+
+from segments import compile_obstacles
+
+
+class DistanceField(object):
+    """ The closest obstacle to every node of a regular grid. A query
+        measures the exact distance from the point to the obstacles
+        closest to the four nodes around it and keeps the closest, so
+        its cost does not depend on the number of obstacles, and the
+        direction away from the obstacle is always taken from the point
+        itself (interpolating directions held by the nodes would point
+        across thin walls, into them).
+    """
+    def __init__(self, obstacles, bounds, resolution, max_distance=None):
+        """
+            obstacles:
+                list of Obstacle entities to rasterize
+            bounds:
+                (left, top, right, bottom) of the area to cover, in metres
+            resolution:
+                spacing of the grid nodes, in metres
+            max_distance:
+                distances are only computed up to this value (metres),
+                nodes further away from every obstacle hold no obstacle
+                and points around them get max_distance and a zero
+                gradient. None computes the full field
+        """
+        self.resolution = float(resolution)
+        self.max_distance = max_distance
+        left, top, right, bottom = bounds
+
+        # one node of padding around the bounds so lookups on the edge
+        # of the field still have four neighbours to interpolate from
+        self.origin = left - self.resolution, top - self.resolution
+        self.ncols = int(ceil((right - left) / self.resolution)) + 3
+        self.nrows = int(ceil((bottom - top) / self.resolution)) + 3
+
+        self.fill = np.inf if max_distance is None else float(max_distance)
+        self.distance = np.empty((self.nrows, self.ncols))
+        self.distance.fill(self.fill)
+        # index of the closest obstacle of every node, segments first then
+        # circles, -1 for none
+        self.nearest = np.empty((self.nrows, self.ncols), dtype=np.intp)
+        self.nearest.fill(-1)
+
+        self.segments, self.circles, _, _ = compile_obstacles(obstacles)
+        for k, segment in enumerate(self.segments.tolist()):
+            self._rasterize_segment(segment, k)
+        for k, circle in enumerate(self.circles.tolist()):
+            self._rasterize_circle(circle, len(self.segments) + k)
+
+    def _node_window(self, xmin, ymin, xmax, ymax):
+        """ Node coordinates (xs, ys) and their slices in the grid
+            arrays, for the nodes inside the given box (or the whole
+            grid when there is no max_distance)
+        """
+        if self.max_distance is None:
+            rows, cols = slice(0, self.nrows), slice(0, self.ncols)
+        else:
+            pad = self.max_distance
+            c0 = max(0, int(floor((xmin - pad - self.origin[0]) / self.resolution)))
+            c1 = min(self.ncols, int(ceil((xmax + pad - self.origin[0]) / self.resolution)) + 1)
+            r0 = max(0, int(floor((ymin - pad - self.origin[1]) / self.resolution)))
+            r1 = min(self.nrows, int(ceil((ymax + pad - self.origin[1]) / self.resolution)) + 1)
+            rows, cols = slice(r0, max(r0, r1)), slice(c0, max(c0, c1))
+
+        xs = self.origin[0] + np.arange(cols.start, cols.stop) * self.resolution
+        ys = self.origin[1] + np.arange(rows.start, rows.stop) * self.resolution
+        return np.meshgrid(xs, ys), (rows, cols)
+
+    def _merge(self, window, dist, index):
+        """ Make obstacle index the closest one of the nodes where dist is
+            closer than what they already hold
+        """
+        closer = dist < self.distance[window]
+        self.distance[window][closer] = dist[closer]
+        self.nearest[window][closer] = index
+
+    @staticmethod
+    def _segment_offsets(x, y, segments):
+        """ Offsets (dx, dy) of the points from the closest points of the
+            segments (x1, y1, x2, y2), clamped to their end points
+        """
+        x1, y1, x2, y2 = segments
+        sx, sy = x2 - x1, y2 - y1
+        length_sqrd = sx**2 + sy**2
+        safe = np.where(length_sqrd == 0, 1.0, length_sqrd)
+        u = np.where(length_sqrd == 0, 0.0, np.clip(((x - x1) * sx + (y - y1) * sy) / safe, 0.0, 1.0))
+        return x - (x1 + u * sx), y - (y1 + u * sy)
+
+    def _rasterize_segment(self, segment, index):
+        x1, y1, x2, y2 = segment
+        (xs, ys), window = self._node_window(min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+
+        dx, dy = self._segment_offsets(xs, ys, segment)
+        self._merge(window, np.sqrt(dx**2 + dy**2), index)
+
+    def _rasterize_circle(self, circle, index):
+        cx, cy, r = circle
+        (xs, ys), window = self._node_window(cx - r, cy - r, cx + r, cy + r)
+
+        dx, dy = xs - cx, ys - cy
+        self._merge(window, np.sqrt(dx**2 + dy**2) - r, index)
+
+    def _cells(self, x, y):
+        """ Top left node (row, col) and the fractional offsets of the
+            point within that cell, clamped to the grid
+        """
+        fx = np.clip((x - self.origin[0]) / self.resolution, 0, self.ncols - 1.000001)
+        fy = np.clip((y - self.origin[1]) / self.resolution, 0, self.nrows - 1.000001)
+        col, row = np.floor(fx).astype(np.intp), np.floor(fy).astype(np.intp)
+        return row, col, fx - col, fy - row
+
+    def sample(self, points):
+        """ Distance and (unit) gradient for an (n, 2) array of points.
+            Returns arrays of shape (n,) and (n, 2)
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        row, col, _, _ = self._cells(points[:, 0], points[:, 1])
+
+        # the closest obstacles of the four nodes around every point
+        candidates = np.column_stack((self.nearest[row, col], self.nearest[row, col + 1],
+                                      self.nearest[row + 1, col], self.nearest[row + 1, col + 1]))
+        x = np.repeat(points[:, 0:1], 4, axis=1)
+        y = np.repeat(points[:, 1:2], 4, axis=1)
+        dist = np.empty(candidates.shape)
+        dist.fill(np.inf)
+        dx, dy = np.zeros(candidates.shape), np.zeros(candidates.shape)
+
+        segment = (candidates >= 0) & (candidates < len(self.segments))
+        if segment.any():
+            dx[segment], dy[segment] = self._segment_offsets(x[segment], y[segment],
+                                                             self.segments[candidates[segment]].T)
+            dist[segment] = np.sqrt(dx[segment]**2 + dy[segment]**2)
+
+        circle = candidates >= len(self.segments)
+        if circle.any():
+            cx, cy, r = self.circles[candidates[circle] - len(self.segments)].T
+            dx[circle], dy[circle] = x[circle] - cx, y[circle] - cy
+            dist[circle] = np.sqrt(dx[circle]**2 + dy[circle]**2) - r
+
+        best = np.argmin(dist, axis=1)
+        rows = np.arange(len(points))
+        dist, gx, gy = dist[rows, best], dx[rows, best], dy[rows, best]
+
+        # points with no obstacle around them
+        none = np.isinf(dist)
+        dist[none] = self.fill
+
+        norm = np.sqrt(gx**2 + gy**2)
+        norm[norm == 0] = 1.0
+        return dist, np.column_stack((gx / norm, gy / norm))
+
+    def lookup(self, point):
+        """ Distance and (unit) gradient at a single (x, y) point, as a
+            float and a (gx, gy) pair
+        """
+        dist, grad = self.sample((point[0], point[1]))
+        return float(dist[0]), (float(grad[0, 0]), float(grad[0, 1]))
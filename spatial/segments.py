@@ -0,0 +1,127 @@
+# exact obstacle geometry compiled into flat numpy arrays
+
+import numpy as np
+
+
+# agents handled at once by ObstacleGeometry.closest_points, this bounds
+# the temporary memory to BLOCK_ROWS x number of segments
+BLOCK_ROWS = 256
+
+
+def compile_obstacles(obstacles):
+    """ Split obstacles into line segments and circles, in metres.
+        Rects contribute their four edges. Returns four arrays:
+        segments (m, 4) as x1, y1, x2, y2, circles (k, 3) as x, y, r
+        and, for each segment/circle, the index of its obstacle
+    """
+    segments, segment_owner = [], []
+    circles, circle_owner = [], []
+
+    for k, obstacle in enumerate(obstacles):
+        if obstacle.type == 'Line':
+            segments.append(obstacle.params)
+            segment_owner.append(k)
+        elif obstacle.type == 'Circle':
+            circles.append(obstacle.params[:3])
+            circle_owner.append(k)
+        elif obstacle.type == 'Rect':
+            x, y, w, h = obstacle.params
+            segments.extend([(x, y, x+w, y), (x, y, x, y+h), (x+w, y, x+w, y+h), (x, y+h, x+w, y+h)])
+            segment_owner.extend([k] * 4)
+
+    return (np.array(segments, dtype=np.float64).reshape(-1, 4),
+            np.array(circles, dtype=np.float64).reshape(-1, 3),
+            np.array(segment_owner, dtype=np.intp),
+            np.array(circle_owner, dtype=np.intp))
+
+
+class ObstacleGeometry(object):
+    """ All scene obstacles as segment and circle arrays, answering
+        "closest point on any obstacle" for a whole crowd at once.
+        Segments are clamped to their end points, circle distances are
+        signed (negative inside the circle).
+    """
+    def __init__(self, obstacles):
+        self.segments, self.circles, self.segment_owner, self.circle_owner = compile_obstacles(obstacles)
+
+        # precomputed segment directions
+        self._start = self.segments[:, :2]
+        self._span = self.segments[:, 2:] - self.segments[:, :2]
+        length_sqrd = (self._span**2).sum(axis=1)
+        length_sqrd[length_sqrd == 0] = 1.0     # degenerate segments are points
+        self._inv_length_sqrd = 1.0 / length_sqrd
+
+    def __len__(self):
+        return len(self.segments) + len(self.circles)
+
+    def _closest_on_segments(self, points):
+        """ (n,) distances, (n, 2) points and (n,) owners of the closest
+            segment for every point
+        """
+        n = len(points)
+        rel = points[:, None, :] - self._start[None, :, :]
+        u = np.clip((rel * self._span[None, :, :]).sum(axis=2) * self._inv_length_sqrd, 0.0, 1.0)
+        foot = self._start[None, :, :] + u[..., None] * self._span[None, :, :]
+        diff = points[:, None, :] - foot
+        dist = np.sqrt(diff[..., 0]**2 + diff[..., 1]**2)
+
+        best = dist.argmin(axis=1)
+        rows = np.arange(n)
+        return dist[rows, best], foot[rows, best], self.segment_owner[best]
+
+    def _closest_on_circles(self, points):
+        centers, radii = self.circles[:, :2], self.circles[:, 2]
+        diff = points[:, None, :] - centers[None, :, :]
+        norm = np.sqrt(diff[..., 0]**2 + diff[..., 1]**2)
+        dist = norm - radii[None, :]
+
+        best = dist.argmin(axis=1)
+        rows = np.arange(len(points))
+        away = diff[rows, best]
+        length = norm[rows, best]
+
+        # a point right on the center is equally close to the whole rim
+        centered = length == 0
+        away[centered] = (1.0, 0.0)
+        length[centered] = 1.0
+
+        foot = centers[best] + away / length[:, None] * radii[best][:, None]
+        return dist[rows, best], foot, self.circle_owner[best]
+
+    def closest_points(self, points):
+        """ Closest obstacle point for an (n, 2) array of points.
+            Returns distances (n,), closest points (n, 2) and the index
+            (into the compiled obstacle list) of the closest obstacle
+            (n,). Without obstacles distances are inf and owners -1
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        n = len(points)
+        distances = np.empty(n)
+        distances.fill(np.inf)
+        closest = np.zeros((n, 2))
+        owners = np.empty(n, dtype=np.intp)
+        owners.fill(-1)
+
+        for start in xrange(0, n, BLOCK_ROWS):
+            block = slice(start, start + BLOCK_ROWS)
+            for found, shapes in ((self._closest_on_segments, self.segments),
+                                  (self._closest_on_circles, self.circles)):
+                if len(shapes) == 0:
+                    continue
+                dist, foot, owner = found(points[block])
+                closer = dist < distances[block]
+                distances[block][closer] = dist[closer]
+                closest[block][closer] = foot[closer]
+                owners[block][closer] = owner[closer]
+
+        return distances, closest, owners
+
+    def closest(self, point, max_distance=float('inf')):
+        """ Closest obstacle point for a single (x, y) point, returned
+            as a (distance, (x, y)) pair like Obstacle.agent_distance,
+            or (inf, None) if nothing is within max_distance
+        """
+        distances, closest, _ = self.closest_points((point[0], point[1]))
+        if not distances[0] <= max_distance:
+            return float('inf'), None
+        return float(distances[0]), (float(closest[0, 0]), float(closest[0, 1]))
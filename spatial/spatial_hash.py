@@ -0,0 +1,150 @@
+# uniform grid (cell list) index over agent positions
+
+from collections import defaultdict
+from math import ceil
+
+import numpy as np
+
+
+class SpatialHash(object):
+    """ Spatial hash over a set of 2D points (agent positions, in
+        metres). Points are binned into a uniform grid of cells, laid
+        out like the simulation grid (see World.xy2coord), so that a
+        radius query only has to look at the cells around the point.
+
+        The index is a snapshot: call build() whenever the positions
+        have changed (typically once per simulation step).
+    """
+    def __init__(self, cell_size, origin=(0.0, 0.0)):
+        """
+            cell_size:
+                (width, height) of a cell in metres, or a single value
+                for square cells
+            origin:
+                (x, y) of the top left corner of cell (0, 0) in metres
+        """
+        if not hasattr(cell_size, '__getitem__'):
+            cell_size = (cell_size, cell_size)
+        self.cell_size = float(cell_size[0]), float(cell_size[1])
+        self.origin = float(origin[0]), float(origin[1])
+
+        self._positions = np.zeros((0, 2))
+        self._cells = dict()
+
+        # candidate pairs distance-checked by the last neighbor_pairs()
+        self.pairs_examined = 0
+
+    def __len__(self):
+        return len(self._positions)
+
+    def coord(self, pos):
+        """ Convert a (x, y) position to the (nrow, ncol) of its cell
+        """
+        return (int(np.floor((pos[1] - self.origin[1]) / self.cell_size[1])),
+                int(np.floor((pos[0] - self.origin[0]) / self.cell_size[0])))
+
+    def build(self, positions):
+        """ (Re)index the (n, 2) array of positions. Point k of the
+            array is refered to by index k in all query results
+        """
+        self._positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        self._rows = np.floor((self._positions[:, 1] - self.origin[1]) / self.cell_size[1]).astype(np.intp)
+        self._cols = np.floor((self._positions[:, 0] - self.origin[0]) / self.cell_size[0]).astype(np.intp)
+
+        # cell -> sorted array of point indices
+        cells = defaultdict(list)
+        for k, coord in enumerate(zip(self._rows.tolist(), self._cols.tolist())):
+            cells[coord].append(k)
+        self._cells = dict((coord, np.array(members, dtype=np.intp)) for coord, members in cells.iteritems())
+
+    def _reach(self, radius):
+        """ Number of cells (rows, cols) to look at on each side of a cell
+            to cover radius
+        """
+        return int(ceil(radius / self.cell_size[1])), int(ceil(radius / self.cell_size[0]))
+
+    def candidates(self, point, radius):
+        """ Indices of all points in the cells that a circle of radius
+            around point touches (a superset of query(), sorted)
+        """
+        row, col = self.coord(point)
+        reach_r, reach_c = self._reach(radius)
+
+        found = [self._cells[(r, c)]
+                    for r in xrange(row - reach_r, row + reach_r + 1)
+                        for c in xrange(col - reach_c, col + reach_c + 1)
+                            if (r, c) in self._cells]
+
+        if not found:
+            return np.zeros(0, dtype=np.intp)
+        return np.sort(np.concatenate(found))
+
+    def query(self, point, radius):
+        """ Indices of all indexed points within radius of point (sorted)
+        """
+        found = self.candidates(point, radius)
+        diff = self._positions[found] - (point[0], point[1])
+        return found[np.sqrt(diff[:, 0]**2 + diff[:, 1]**2) <= radius]
+
+    def neighbor_pairs(self, radius):
+        """ Bulk radius query for all indexed points. Return two index
+            arrays (i, j) with every ordered pair of distinct points such
+            that |p_j - p_i| <= radius, sorted by i and then j
+        """
+        n = len(self._positions)
+        if n == 0:
+            self.pairs_examined = 0
+            return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+
+        # points sorted by cell, with a single integer key per cell
+        rows = self._rows - self._rows.min()
+        cols = self._cols - self._cols.min()
+        nrows, ncols = rows.max() + 1, cols.max() + 1
+        keys = rows * ncols + cols
+        order = np.argsort(keys, kind='mergesort')
+        sorted_keys = keys[order]
+
+        reach_r, reach_c = self._reach(radius)
+        agents = np.arange(n)
+        pairs_i, pairs_j = [], []
+        self.pairs_examined = 0
+
+        for dr in xrange(-reach_r, reach_r + 1):
+            for dc in xrange(-reach_c, reach_c + 1):
+                nr, nc = rows + dr, cols + dc
+                inside = (nr >= 0) & (nr < nrows) & (nc >= 0) & (nc < ncols)
+                nkeys = (nr * ncols + nc)[inside]
+
+                # slice of the sorted points falling in the neighbor cell
+                start = np.searchsorted(sorted_keys, nkeys, side='left')
+                stop = np.searchsorted(sorted_keys, nkeys, side='right')
+                counts = stop - start
+                total = counts.sum()
+                if total == 0:
+                    continue
+                self.pairs_examined += int(total)
+
+                # expand the (start, count) runs into explicit pairs
+                i = np.repeat(agents[inside], counts)
+                run_offsets = np.repeat(np.cumsum(counts) - counts, counts)
+                j = order[np.repeat(start, counts) + np.arange(total) - run_offsets]
+
+                diff = self._positions[j] - self._positions[i]
+                keep = (np.sqrt(diff[:, 0]**2 + diff[:, 1]**2) <= radius) & (i != j)
+                pairs_i.append(i[keep])
+                pairs_j.append(j[keep])
+
+        if not pairs_i:
+            return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+
+        i, j = np.concatenate(pairs_i), np.concatenate(pairs_j)
+        ordering = np.lexsort((j, i))
+        return i[ordering], j[ordering]
+
+    def all_neighbors(self, radius):
+        """ Bulk radius query, return a list holding for every indexed
+            point the (sorted) array of its neighbors within radius
+        """
+        i, j = self.neighbor_pairs(radius)
+        bounds = np.searchsorted(i, np.arange(1, len(self._positions)))
+        return np.split(j, bounds)
@@ -0,0 +1,99 @@
+# Verlet neighbor lists (cached neighborhoods with a skin radius)
+
+import numpy as np
+
+
+class VerletList(object):
+    """ Caches, for every point, the neighbors within radius + skin.
+        As long as no point has moved more than skin/2 since the lists
+        were built, every pair closer than radius is guaranteed to be
+        in the cache, so the (costly) neighbor search can be skipped
+        and only the cached candidates need checking.
+    """
+    def __init__(self, radius, skin, index):
+        """
+            radius:
+                interaction radius the lists must cover (metres)
+            skin:
+                extra distance searched beyond radius (metres)
+            index:
+                a SpatialHash used to (re)build the lists
+        """
+        self.radius = radius
+        self.skin = skin
+        self.index = index
+
+        # number of times the lists were rebuilt
+        self.rebuilds = 0
+        # cached pairs distance-checked by the last neighbor_pairs()
+        self.pairs_examined = 0
+
+        self._reference = None
+        self._pairs = np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+        self._lists = []
+
+    @property
+    def cutoff(self):
+        return self.radius + self.skin
+
+    def max_displacement(self, positions):
+        """ Largest distance any point has moved since the last rebuild
+        """
+        if self._reference is None or len(positions) != len(self._reference):
+            return float('inf')
+        if len(positions) == 0:
+            return 0.0
+
+        moved = np.asarray(positions, dtype=np.float64) - self._reference
+        return np.sqrt(moved[:, 0]**2 + moved[:, 1]**2).max()
+
+    def update(self, positions):
+        """ Rebuild the lists if any point moved more than skin/2 since
+            the last rebuild (or the number of points changed). Return
+            True when the lists were rebuilt
+        """
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        if self.max_displacement(positions) <= self.skin / 2.0:
+            return False
+
+        self.rebuild(positions)
+        return True
+
+    def rebuild(self, positions):
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        self.index.build(positions)
+        self._pairs = self.index.neighbor_pairs(self.cutoff)
+
+        i, j = self._pairs
+        self._lists = np.split(j, np.searchsorted(i, np.arange(1, len(positions))))
+        self._reference = positions.copy()
+        self.rebuilds += 1
+
+    def track(self, k, position):
+        """ Check a single point that has just moved (e.g. while agents
+            are updated one after the other). Return True when it has
+            left its skin and the lists must be rebuilt
+        """
+        ref = self._reference[k]
+        return (position[0] - ref[0])**2 + (position[1] - ref[1])**2 > (self.skin / 2.0)**2
+
+    def neighbors(self, k):
+        """ Cached candidate neighbors of point k (sorted), a superset of
+            the points within radius of it
+        """
+        return self._lists[k]
+
+    def neighbor_pairs(self, positions, radius=None):
+        """ Bulk query: all ordered pairs (i, j), sorted by i then j, of
+            points within radius (defaults to the list radius) of each
+            other at the given positions, taken from the cached lists
+        """
+        if radius is None:
+            radius = self.radius
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+
+        i, j = self._pairs
+        self.pairs_examined = len(i)
+        diff = positions[j] - positions[i]
+        keep = np.sqrt(diff[:, 0]**2 + diff[:, 1]**2) <= radius
+        return i[keep], j[keep]
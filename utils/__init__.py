@@ -1,8 +1,10 @@
 from __future__ import division                 #to avoid integer devision problem
 
 
-from timers import Timer
-from widgets import Box
+from timers import Timer, FixedStepScheduler
+from profiling import Profiler
+from tracing import Tracer
+from metrics import MetricsRegistry, memory_in_use
 from vec2d import vec2d
 from gridmap import GridMap
 from colors import *
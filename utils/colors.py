@@ -1,23 +1,22 @@
-# just a list of common colors
-
-from pygame import Color
+# just a list of common colors, as plain (r, g, b) tuples so that
+# the headless core does not depend on pygame
 
 SIM_COLORS = {
-    'aqua' : Color(0, 255, 255),
-    'black' : Color(0, 0, 0),
-    'blue' : Color(0, 0, 255),
-    'fuchsia' : Color(255, 0, 255),
-    'gray' : Color(128, 128, 128),
-    'light gray' : Color(50, 50, 50),
-    'green' : Color(0, 128, 0),
-    'lime' : Color(0, 255, 0),
-    'maroon' : Color(128, 0, 0),
-    'navy blue' : Color(0, 0, 128),
-    'olive' : Color(128, 128, 0),
-    'purple' : Color(128, 0, 128),
-    'red' : Color(255, 0, 0),
-    'silver' : Color(192, 192, 192),
-    'teal' : Color(0, 128, 128),
-    'white' : Color(255, 255, 255),
-    'yellow' : Color(255, 255, 0)
+    'aqua' : (0, 255, 255),
+    'black' : (0, 0, 0),
+    'blue' : (0, 0, 255),
+    'fuchsia' : (255, 0, 255),
+    'gray' : (128, 128, 128),
+    'light gray' : (50, 50, 50),
+    'green' : (0, 128, 0),
+    'lime' : (0, 255, 0),
+    'maroon' : (128, 0, 0),
+    'navy blue' : (0, 0, 128),
+    'olive' : (128, 128, 0),
+    'purple' : (128, 0, 128),
+    'red' : (255, 0, 0),
+    'silver' : (192, 192, 192),
+    'teal' : (0, 128, 128),
+    'white' : (255, 255, 255),
+    'yellow' : (255, 255, 0)
 }
\ No newline at end of file
@@ -6,6 +6,10 @@ from custom_types import ForceFactor
 SCALE = 100.0
 
 
+# radius (in metres) within which agents exert social forces on each other
+NEIGHBOR_RADIUS = 0.5
+
+
 # scaling factors the social force model
 SF_FACTORS = ForceFactor(
     social = 2.1, 
@@ -15,4 +19,7 @@ SF_FACTORS = ForceFactor(
     )
 
 
-SIGN = lambda x: (1, -1)[x < 0.0]
\ No newline at end of file
+SIGN = lambda x: (1, -1)[x < 0.0]
+
+# counts of the work done by a simulation step, see World.step_stats
+STEP_STATS = ('neighbors_examined', 'neighbors_found', 'max_neighbors', 'obstacle_queries')
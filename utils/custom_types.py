@@ -5,6 +5,21 @@ Forces = namedtuple('Forces', 'social obstacle desired lookahead')
 ForceFactor = namedtuple('ForceFactor', 'social obstacle desired lookahead')
 
 
+class FieldRect(namedtuple('FieldRect', 'left top width height')):
+    """ Pygame-free stand-in for pygame.Rect, describing the field
+        of play of a headless world (in pixels)
+    """
+    __slots__ = ()
+
+    @property
+    def right(self):
+        return self.left + self.width
+
+    @property
+    def bottom(self):
+        return self.top + self.height
+
+
 class cached_property(object):
     """
     Lazy-loading read/write property descriptor.
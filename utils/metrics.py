@@ -0,0 +1,192 @@
+import os
+import platform
+import threading
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from collections import deque, OrderedDict
+from timeit import default_timer
+
+import numpy as np
+
+
+def memory_in_use():
+    """ Resident memory of the process in bytes (the peak where the
+        current figure is not available, 0 where neither is)
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, IndexError, ValueError):
+        pass
+
+    # not available on windows
+    try:
+        import resource
+    except ImportError:
+        return 0
+
+    # kilobytes on linux, bytes on mac os
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if platform.system() == 'Darwin' else peak * 1024
+
+
+class Gauge(object):
+    """ A value that goes up and down, set or read from a function """
+    kind = 'gauge'
+
+    def __init__(self, name, description, function=None):
+        self.name = name
+        self.description = description
+        self.function = function
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def get(self):
+        return self.function() if self.function is not None else self.value
+
+    def samples(self):
+        return [(self.name, None, self.get())]
+
+
+class Counter(Gauge):
+    """ A running total """
+    kind = 'counter'
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Rate(Gauge):
+    """ Events per second, over the last window events """
+    def __init__(self, name, description, window=100):
+        Gauge.__init__(self, name, description)
+        self._times = deque(maxlen=window)
+
+    def mark(self, now=None):
+        self._times.append(default_timer() if now is None else now)
+
+    def get(self):
+        times = list(self._times)
+        if len(times) < 2 or times[-1] == times[0]:
+            return 0.0
+        return (len(times) - 1) / (times[-1] - times[0])
+
+
+class Summary(object):
+    """ Quantiles of the last window observations, along with the sum
+        and count of all of them
+    """
+    kind = 'summary'
+
+    def __init__(self, name, description, quantiles=(0.5, 0.95, 0.99), window=1000):
+        self.name = name
+        self.description = description
+        self.quantiles = quantiles
+        self.sum = 0.0
+        self.count = 0
+        self._window = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self._window.append(value)
+            self.sum += value
+            self.count += 1
+
+    def get(self):
+        """ {quantile: value} over the window """
+        with self._lock:
+            window = list(self._window)
+        if not window:
+            return dict((q, 0.0) for q in self.quantiles)
+        values = np.percentile(window, [q * 100 for q in self.quantiles])
+        return dict(zip(self.quantiles, values.tolist()))
+
+    def samples(self):
+        samples = [(self.name, 'quantile="%g"' % q, value) for q, value in sorted(self.get().items())]
+        return samples + [(self.name + '_sum', None, self.sum), (self.name + '_count', None, self.count)]
+
+
+class MetricsRegistry(object):
+    """ Named metrics of a running simulation, readable as a dict or in
+        the Prometheus text exposition format, written to a file (see
+        write) or served over HTTP (see serve)
+    """
+    def __init__(self, prefix='crowdsim_'):
+        self.prefix = prefix
+        self.metrics = OrderedDict()
+        self._server = None
+
+    def __getitem__(self, name):
+        return self.metrics[self.prefix + name]
+
+    def add(self, metric):
+        metric.name = self.prefix + metric.name
+        self.metrics[metric.name] = metric
+        return metric
+
+    def gauge(self, name, description, function=None):
+        return self.add(Gauge(name, description, function))
+
+    def counter(self, name, description):
+        return self.add(Counter(name, description))
+
+    def rate(self, name, description, window=100):
+        return self.add(Rate(name, description, window))
+
+    def summary(self, name, description, quantiles=(0.5, 0.95, 0.99), window=1000):
+        return self.add(Summary(name, description, quantiles, window))
+
+    def as_dict(self):
+        return OrderedDict((name, metric.get()) for name, metric in self.metrics.items())
+
+    def exposition(self):
+        """ The metrics in the Prometheus text exposition format """
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append('# HELP %s %s' % (name, metric.description))
+            lines.append('# TYPE %s %s' % (name, metric.kind))
+            for sample, labels, value in metric.samples():
+                lines.append('%s%s %r' % (sample, '' if labels is None else '{%s}' % labels, float(value)))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, filename):
+        """ Write the exposition to filename, replacing it at once so
+            readers never see a partial file
+        """
+        partial = filename + '.partial'
+        with open(partial, 'w') as f:
+            f.write(self.exposition())
+        os.rename(partial, filename)
+
+    def serve(self, port, host='127.0.0.1'):
+        """ Serve the exposition over HTTP (any path) from a background
+            thread, until close()
+        """
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.exposition()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.close()
+        self._server = HTTPServer((host, port), Handler)
+        thread = threading.Thread(target=self._server.serve_forever, name='MetricsServer')
+        thread.daemon = True
+        thread.start()
+        return self._server.server_address
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,166 @@
+from collections import defaultdict
+from functools import wraps
+from timeit import default_timer
+
+
+class Profiler(object):
+    """ Cumulative wall time and call counts of the phases of a step.
+
+        Phases are timed by wrapping the functions doing them (hooks),
+        and the wrappers are only in place while the profiler is
+        enabled, so a disabled profiler costs nothing at all. Phases may
+        nest (eg. social inside social_move inside drive): 'time' is
+        the inclusive time of a phase and 'self' its time less that of
+        the phases nested in it.
+
+        Hooks are installed on the classes and modules owning the
+        functions; profilers enabled at the same time wrap each other.
+        As the hooks are shared by the whole process, a profiler given
+        an instance only counts the work done for it: hooks on methods
+        of the instance's classes time the calls made on that instance
+        (and go to the method its own class overrides them with), any
+        other hook only times calls made while one of those is running.
+    """
+    def __init__(self, hooks=(), instance=None):
+        """
+            hooks:
+                list of (phase, owner, name), the function name of the
+                class or module owner is timed as phase. Several hooks
+                may share a phase
+            instance:
+                object whose work is timed, every call is timed when
+                None
+        """
+        self.hooks = list(hooks)
+        self.instance = instance
+        self.times = defaultdict(float)
+        self.own_times = defaultdict(float)
+        self.calls = defaultdict(int)
+        self._stack = []
+        self._installed = []
+        # number of calls on the instance running
+        self._active = [0]
+
+        # called with (phase, start, end) after every timed call
+        self._after = None
+
+    @property
+    def enabled(self):
+        return bool(self._installed)
+
+    def enable(self):
+        if self.enabled:
+            return
+        for phase, owner, name in self.hooks:
+            entry = self._is_entry(owner)
+            if entry:
+                # the method as the instance's own class has it
+                owner = next(cls for cls in type(self.instance).__mro__ if name in cls.__dict__)
+            wrapper = self._timed(phase, owner.__dict__[name], entry)
+            self._installed.append((owner, name, wrapper))
+            setattr(owner, name, wrapper)
+
+    def disable(self):
+        # calls running keep their wrapper until they return
+        self._restore()
+
+    def toggle(self):
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable()
+        return self.enabled
+
+    def reset(self):
+        self.times.clear()
+        self.own_times.clear()
+        self.calls.clear()
+
+    def _restore(self):
+        for owner, name, wrapper in reversed(self._installed):
+            current = owner.__dict__[name]
+            if current is wrapper:
+                setattr(owner, name, wrapper.wrapped)
+                continue
+            # another profiler wrapped it since, take ours out of its chain
+            while current.wrapped is not wrapper:
+                current = current.wrapped
+            current.wrapped = wrapper.wrapped
+        self._installed = []
+
+    def _is_entry(self, owner):
+        """ Whether hooks on owner are methods of the instance
+        """
+        return self.instance is not None and isinstance(owner, type) and isinstance(self.instance, owner)
+
+    def _timed(self, phase, function, entry=False):
+        times, own_times, calls, stack, after = self.times, self.own_times, self.calls, self._stack, \
+                                                self._after
+        instance, active = self.instance, self._active
+
+        @wraps(function)
+        def timed(*args, **kwargs):
+            if entry:
+                if not args or args[0] is not instance:
+                    return timed.wrapped(*args, **kwargs)
+                active[0] += 1
+            elif instance is not None and not active[0]:
+                return timed.wrapped(*args, **kwargs)
+
+            # time spent in nested phases accumulates on top of the stack
+            stack.append(0.0)
+            start = default_timer()
+            try:
+                return timed.wrapped(*args, **kwargs)
+            finally:
+                end = default_timer()
+                elapsed = end - start
+                nested = stack.pop()
+                times[phase] += elapsed
+                own_times[phase] += elapsed - nested
+                calls[phase] += 1
+                if stack:
+                    stack[-1] += elapsed
+                if entry:
+                    active[0] -= 1
+                if after is not None:
+                    after(phase, start, end)
+        timed.wrapped = function
+        return timed
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.disable()
+
+    def phases(self):
+        """ The phases in hook order """
+        seen = []
+        for phase, _, _ in self.hooks:
+            if phase not in seen:
+                seen.append(phase)
+        return seen
+
+    def results(self):
+        """ The phases timed so far, {phase: dict(time, self, calls,
+            mean)}, times in seconds
+        """
+        return dict((phase, dict(time=self.times[phase],
+                                 self=self.own_times[phase],
+                                 calls=self.calls[phase],
+                                 mean=self.times[phase] / self.calls[phase]))
+                    for phase in self.phases() if self.calls[phase])
+
+    def format_table(self):
+        """ The results as a plain text table, one phase per line """
+        results = self.results()
+        rows = [('phase', 'calls', 'time (s)', 'self (s)', 'mean (ms)')]
+        rows += [(phase, str(results[phase]['calls']), '%.3f' % results[phase]['time'],
+                  '%.3f' % results[phase]['self'], '%.3f' % (results[phase]['mean'] * 1000))
+                 for phase in self.phases() if phase in results]
+        widths = [max(len(row[k]) for row in rows) for k in xrange(len(rows[0]))]
+        return '\n'.join('  '.join(value.ljust(width) if k == 0 else value.rjust(width)
+                                   for k, (value, width) in enumerate(zip(row, widths)))
+                         for row in rows)
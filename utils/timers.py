@@ -43,3 +43,72 @@ class Timer(object):
             if self.oneshot:
                 self.alive = False
 
+
+
+class FixedStepScheduler(object):
+    """ Drives a simulation with fixed size steps from the wall clock.
+
+        Wall time passed to update() (scaled by the real time
+        multiplier) is accumulated and consumed in steps of exactly
+        step_size, so the simulation advances deterministically
+        whatever the frame rate. When the simulation cannot keep up,
+        at most max_steps_per_frame steps are run per update() and the
+        rest of the backlog is dropped (counted in self.dropped_steps)
+        rather than snowballing.
+    """
+    def __init__(self, step_size, callback, speed=1.0, max_steps_per_frame=5):
+        """ Create a new FixedStepScheduler.
+
+            step_size:
+                Simulated time of a single step, in seconds
+
+            callback:
+                Callable, to call once per step
+
+            speed:
+                Real time multiplier, simulated seconds per wall clock
+                second (0.5, 1, 10, ...). None runs as fast as possible,
+                max_steps_per_frame steps per update()
+
+            max_steps_per_frame:
+                Bound on the steps run by a single update() call
+        """
+        self.step_size = step_size
+        self.callback = callback
+        self.speed = speed
+        self.max_steps_per_frame = max_steps_per_frame
+        self.accumulator = 0.0
+        self.dropped_steps = 0
+
+    def update(self, time_passed):
+        """ Account for time_passed milliseconds of wall time and run the
+            steps that are due. Returns the number of steps run
+        """
+        if self.speed is None:
+            for _ in xrange(self.max_steps_per_frame):
+                self.callback()
+            return self.max_steps_per_frame
+
+        self.accumulator += time_passed / 1000.0 * self.speed
+
+        steps = 0
+        while self.accumulator >= self.step_size and steps < self.max_steps_per_frame:
+            self.callback()
+            self.accumulator -= self.step_size
+            steps += 1
+
+        # too far behind to catch up, forget about the backlog
+        if self.accumulator >= self.step_size:
+            behind = int(self.accumulator / self.step_size)
+            self.dropped_steps += behind
+            self.accumulator -= behind * self.step_size
+
+        return steps
+
+    def time_until_next_step(self):
+        """ Wall time (in milliseconds) until the next step is due, None
+            when running as fast as possible
+        """
+        if self.speed is None:
+            return None
+        return max(0.0, (self.step_size - self.accumulator) / self.speed * 1000.0)
@@ -0,0 +1,58 @@
+import json
+import os
+from timeit import default_timer
+
+from profiling import Profiler
+
+
+class Tracer(Profiler):
+    """ Records every call of the hooked phases as a span on a timeline,
+        saved in the Chrome trace event format (open it in
+        chrome://tracing or ui.perfetto.dev). Counters, sampled at the
+        end of every span of one phase, are recorded along with them.
+
+        It is a Profiler (see there for hooks), so its totals are kept
+        too, and like any profiler costs nothing until enabled.
+    """
+    def __init__(self, hooks=(), counters=None, sample_after=None, instance=None):
+        """
+            hooks, instance:
+                see Profiler
+            counters:
+                callable returning a dict of {name: value}
+            sample_after:
+                the phase after which counters are sampled
+        """
+        Profiler.__init__(self, hooks, instance)
+        self.counters = counters
+        self.sample_after = sample_after
+        self.events = []
+        self._origin = default_timer()
+        self._after = self._record
+
+    def _record(self, phase, start, end):
+        self.events.append((phase, start, end - start))
+        if phase == self.sample_after and self.counters is not None:
+            self.events.append((None, end, self.counters()))
+
+    def reset(self):
+        Profiler.reset(self)
+        del self.events[:]
+        self._origin = default_timer()
+
+    def trace_events(self):
+        """ Generate the recorded spans and counters as trace events,
+            times in microseconds
+        """
+        pid = os.getpid()
+        for phase, start, value in self.events:
+            ts = (start - self._origin) * 1e6
+            if phase is None:
+                for name, count in sorted(value.items()):
+                    yield dict(name=name, ph='C', ts=ts, pid=pid, args={name: count})
+            else:
+                yield dict(name=phase, cat='crowdsim', ph='X', ts=ts, dur=value * 1e6, pid=pid, tid=0)
+
+    def write(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(dict(traceEvents=list(self.trace_events()), displayTimeUnit='ms'), f)
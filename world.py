@@ -0,0 +1,661 @@
+from random import randint, normalvariate
+from math import ceil
+from timeit import default_timer
+
+import numpy as np
+
+from entities import Agent, Waypoint, Obstacle
+from iosystem import TrajectoryRecorder, BackgroundWriter, save_checkpoint, read_checkpoint, \
+                     restore_random_state
+from iosystem.compiled_scene import _as_list
+from physics import CrowdState, DomainDecomposition
+from spatial import SpatialHash, VerletList, DistanceField, ObstacleGeometry, AABBTree
+from utils import FieldRect, ForceFactor, SCALE, NEIGHBOR_RADIUS, random_position, Profiler, \
+                  Tracer, MetricsRegistry, memory_in_use, STEP_STATS
+from controllers import SocialForceController
+import controllers.social_force_controller as social_force_controller
+
+
+class World(object):
+    """
+    Headless simulation core. Owns the agents, waypoints and obstacles
+    and advances them in time without touching pygame, so it can run
+    on machines without a display. The pygame window (see
+    crowdsim.Simulation) is an optional viewer built on top of it.
+    """
+
+    # basic defaults
+    GRID_SIZE = 20, 20
+    FIELD_SIZE = 500, 500
+    FIELD_LIMITS = 0, 0, 600, 600
+
+    # default simulation step (in seconds)
+    STEP_SIZE = 0.1
+
+    # mean and standard deviation of the agents' maximum speeds (in m/s)
+    SPEED_DISTRIBUTION = 1.34, 0.26
+
+    def __init__(self, params=None):
+        self.params = params
+        if params is not None:
+            self.FIELD_LIMITS = int(float(params['field_top_left_x']) * SCALE), \
+                                int(float(params['field_top_left_y']) * SCALE), \
+                                int(float(params['field_bottom_right_x']) * SCALE), \
+                                int(float(params['field_bottom_right_y']) * SCALE)
+            self.FIELD_SIZE = self.FIELD_LIMITS[2] - self.FIELD_LIMITS[0], self.FIELD_LIMITS[3] - self.FIELD_LIMITS[1]
+            self.GRID_SIZE = int(float(params['cell']['width']) * SCALE), int(float(params['cell']['height']) * SCALE)
+
+        # zoom (only meaningful to viewers, but the grid depends on it)
+        self.zoom_factor = 1.0
+
+        # drawing handles, left empty when running headless
+        self.screen = None
+        self.agent_image = None
+
+        self.setup_field()
+
+        # agents
+        self.agents = []
+        self.controller = SocialForceController(self)
+        # self.controller = RandomController(self)
+
+        # create the grid
+        self.setup_grid()
+        self.setup_neighbor_index()
+
+        # setup objects (waypoints, obstacles)
+        self.waypoints = dict()
+        self.obstacles = []
+        self.obstacle_field = None
+        self.obstacle_geometry = None
+        self._obstacle_compilation = None, None, None
+        self._agent_count = 0
+
+        # whole-crowd arrays used when stepping in batch mode
+        self.batch_mode = False
+        self.crowd = None
+        self.domain = None
+        self._agents_stale = False
+
+        # simulated time (in seconds) and number of steps taken
+        self.sim_time = 0.0
+        self.step_count = 0
+
+        # counts of the work done by the last step
+        self.step_stats = dict.fromkeys(STEP_STATS, 0)
+
+        # trajectory output, see record_trajectory
+        self.recorder = None
+        self.writer = None
+
+        # per phase timing of the steps of this world, off until enabled
+        self.profiler = Profiler(PROFILE_HOOKS, instance=self)
+
+        # timeline of the steps, see trace
+        self.tracer = Tracer(TRACE_HOOKS, self.trace_counters, sample_after='step', instance=self)
+        self._trace_file = None
+
+        # live metrics of the run, see monitor
+        self.metrics = None
+        self._metrics_file = None
+        self._metrics_interval = None
+        self._metrics_written = None
+
+    def setup_field(self):
+        self.field_rect = FieldRect(self.FIELD_LIMITS[0],
+                                    self.FIELD_LIMITS[1],
+                                    int(self.FIELD_SIZE[0]*self.zoom_factor),
+                                    int(self.FIELD_SIZE[1]*self.zoom_factor))
+
+    def setup_grid(self):
+        self.grid_nrows = self.FIELD_SIZE[1] / int(self.GRID_SIZE[0]*self.zoom_factor)
+        self.grid_ncols = self.FIELD_SIZE[0] / int(self.GRID_SIZE[1]*self.zoom_factor)
+
+    def setup_neighbor_index(self):
+        """ Spatial hash answering the agent neighbor queries. Its cells
+            are the smallest multiple of the grid cells that covers
+            NEIGHBOR_RADIUS, so a query only visits the adjacent cells
+        """
+        cell_w, cell_h = self.GRID_SIZE[0] / SCALE, self.GRID_SIZE[1] / SCALE
+        k = max(1, int(ceil(NEIGHBOR_RADIUS / min(cell_w, cell_h))))
+        self.agent_index = SpatialHash((cell_w * k, cell_h * k),
+                                       origin=(self.field_rect.left / SCALE, self.field_rect.top / SCALE))
+        self.agent_verlet = None
+        self._index_margin = None
+
+    def use_verlet_lists(self, skin=0.8):
+        """ Cache the neighbors of every agent within NEIGHBOR_RADIUS + skin
+            (metres) and only search again once some agent has moved more
+            than skin/2 since. skin=None goes back to rebuilding the
+            spatial hash every step
+        """
+        if skin is None:
+            self.agent_verlet = None
+        else:
+            self.agent_verlet = VerletList(NEIGHBOR_RADIUS, skin, self.agent_index)
+
+    def index_agents(self, dt):
+        """ Rebuild the agent spatial hash from the current positions (or
+            refresh the Verlet lists, when enabled)
+        """
+        positions = [(agent.position.x, agent.position.y) for agent in self.agents]
+
+        if self.agent_verlet is not None:
+            # positions are checked as agents move, see track_agent()
+            self._agent_slots = dict((agent.id, k) for k, agent in enumerate(self.agents))
+            self.agent_verlet.update(positions)
+            self._index_margin = 0.0
+            return
+
+        self.agent_index.build(positions)
+
+        # agents keep moving while the step is running (clamped into the
+        # field, then driven by at most vmax*dt), so queries are padded
+        # by the furthest any of them can get from its indexed position
+        vmax = max([agent.vmax for agent in self.agents] or [0.0])
+        self._index_margin = 2.0 * vmax * dt
+
+    def track_agent(self, k, agent):
+        """ Rebuild the Verlet lists as soon as agent k has moved out of
+            its skin, so queries later in the same step stay exact
+        """
+        if self.agent_verlet.track(k, agent.position):
+            self.agent_verlet.rebuild([(other.position.x, other.position.y) for other in self.agents])
+
+    def agent_neighbor_pairs(self, positions, radius=NEIGHBOR_RADIUS):
+        """ Bulk neighbor query for batch controllers: all ordered pairs
+            (i, j) of rows of the (n, 2) positions within radius of each
+            other, sorted by i then j
+        """
+        if self.agent_verlet is not None and radius <= self.agent_verlet.radius:
+            self.agent_verlet.update(positions)
+            pairs = self.agent_verlet.neighbor_pairs(positions, radius)
+            self.step_stats['neighbors_examined'] += self.agent_verlet.pairs_examined
+            self._count_neighbor_pairs(pairs[0])
+            return pairs
+
+        self.agent_index.build(positions)
+        pairs = self.agent_index.neighbor_pairs(radius)
+        self.step_stats['neighbors_examined'] += self.agent_index.pairs_examined
+        self._count_neighbor_pairs(pairs[0])
+        return pairs
+
+    def _count_neighbor_pairs(self, i):
+        stats = self.step_stats
+        stats['neighbors_found'] += len(i)
+        if len(i):
+            stats['max_neighbors'] = max(stats['max_neighbors'], int(np.bincount(i).max()))
+
+    def get_agent_neighbors(self, agent, dist_range):
+        if self._index_margin is None:
+            candidates = self.agents
+        elif self.agent_verlet is not None:
+            if dist_range <= self.agent_verlet.radius:
+                candidates = [self.agents[k] for k in
+                    self.agent_verlet.neighbors(self._agent_slots[agent.id])]
+            else:
+                candidates = self.agents
+        else:
+            candidates = [self.agents[k] for k in
+                self.agent_index.candidates(agent.position, dist_range + self._index_margin)]
+        neighbors = []
+        for other in candidates:
+            if not agent.id == other.id:
+                dist = agent.position.get_distance(other.position)
+                if dist <= dist_range:
+                    neighbors.append(other)
+
+        stats = self.step_stats
+        stats['neighbors_examined'] += len(candidates)
+        stats['neighbors_found'] += len(neighbors)
+        if len(neighbors) > stats['max_neighbors']:
+            stats['max_neighbors'] = len(neighbors)
+        return neighbors
+
+    def xy2coord(self, pos):
+        """ Convert a (x, y) pair to a (nrow, ncol) coordinate
+        """
+        x, y = (pos[0] - self.field_rect.left, pos[1] - self.field_rect.top)
+        return int(y) / self.GRID_SIZE[1], int(x) / self.GRID_SIZE[0]
+
+    def coord2xy_mid(self, coord):
+        """ Convert a (nrow, ncol) coordinate to a (x, y) pair,
+            where x,y is the middle of the square at the coord
+        """
+        nrow, ncol = coord
+        return (
+            self.field_rect.left + ncol * self.GRID_SIZE[0] + self.GRID_SIZE[0] / 2,
+            self.field_rect.top + nrow * self.GRID_SIZE[1] + self.GRID_SIZE[1] / 2)
+
+    def use_batch_mode(self, enabled=True):
+        """ Step the whole crowd at once through the controller's
+            drive_batch (on a CrowdState) instead of agent by agent.
+            Agents are then only brought up to date by sync_agents()
+        """
+        if not enabled:
+            self.sync_agents()
+            self.crowd = None
+        self.batch_mode = enabled
+
+    def use_domain_decomposition(self, tiles=(2, 2), processes=None):
+        """ Step the crowd in batch mode, split over worker processes by
+            cutting the field into a grid of (columns, rows) tiles (see
+            physics.DomainDecomposition). Obstacles must be added (and
+            compiled) beforehand. tiles=None stops the workers
+        """
+        if self.domain is not None:
+            self.domain.close()
+            self.domain = None
+
+        if tiles is not None:
+            self.use_batch_mode()
+            self.domain = DomainDecomposition(self, tiles, processes)
+
+    def record_trajectory(self, filename, backpressure='block', queue_size=64):
+        """ Record the agents after every step into a trajectory file
+            (see iosystem.TrajectoryRecorder), starting with their current
+            state. Frames are written by a background thread (see
+            iosystem.BackgroundWriter for the backpressure policies; with
+            'drop' and 'decimate' steps may go missing, every frame keeps
+            the step and time it was taken at)
+        """
+        self.stop_recording()
+        self.recorder = TrajectoryRecorder(filename, len(self.agents), self.STEP_SIZE, self.sim_time)
+        self.writer = BackgroundWriter(self.recorder.write_snapshot, self.recorder.close,
+                                       queue_size, backpressure)
+        self.writer.put(self.recorder.snapshot(self))
+
+    def stop_recording(self):
+        """ Write out the pending frames and close the trajectory file
+        """
+        if self.writer is not None:
+            self.writer.close()
+        self.recorder = self.writer = None
+
+    def save_checkpoint(self, filename):
+        """ Write the complete simulation state to a binary checkpoint
+            (see iosystem.save_checkpoint)
+        """
+        save_checkpoint(self, filename)
+
+    @classmethod
+    def from_checkpoint(cls, filename, **kwargs):
+        """ A new world (of this class, created with kwargs) in the
+            state saved by save_checkpoint, without going through the
+            scene file. The neighbor index options, domain decomposition
+            and recording are not part of the checkpoint
+        """
+        checkpoint = read_checkpoint(filename)
+        world = cls(params=checkpoint['params'], **kwargs)
+        world.restore(checkpoint)
+        return world
+
+    def restore(self, checkpoint):
+        """ Replace the waypoints, obstacles, agents, time, controller
+            state and random state of this (new) world by the ones of a
+            checkpoint (see iosystem.read_checkpoint). The world must use
+            the same kind of controller as the checkpointed one
+        """
+        settings = checkpoint['settings']
+        # checkpoints of older versions did not name their controller
+        controller = settings.get('controller', type(self.controller).__name__)
+        if controller != type(self.controller).__name__:
+            raise ValueError('the checkpoint was taken with a %s, this world uses a %s' %
+                             (controller, type(self.controller).__name__))
+        self.STEP_SIZE = settings['step_size']
+        self.SPEED_DISTRIBUTION = tuple(settings['speed_distribution'])
+        if settings['factors'] is not None:
+            self.controller.factors = ForceFactor(*settings['factors'])
+        self.sim_time, self.step_count = checkpoint['time'].tolist()
+        self.step_count = int(self.step_count)
+
+        # entities keep their geometry in pixels, which is what was saved
+        self.waypoints = dict()
+        waypoints = []
+        for (wid, wtype), (x, y, radius) in zip(checkpoint['waypoints'],
+                                                checkpoint['waypoint_geometry'].tolist()):
+            waypoint = Waypoint(screen=self.screen, wid=wid, wtype=wtype, position=(0, 0), radius=0)
+            waypoint._position.x, waypoint._position.y, waypoint._radius = x, y, radius
+            self.waypoints[wid] = waypoint
+            waypoints.append(waypoint)
+
+        self.obstacles = []
+        for (oid, otype), params in zip(checkpoint['obstacles'], checkpoint['obstacle_geometry'].tolist()):
+            obstacle = Obstacle(screen=self.screen, oid=oid, otype=otype, params=(0, 0, 0, 0))
+            obstacle._params = tuple(params)
+            self.obstacles.append(obstacle)
+
+        columns = dict((name, checkpoint['agent_' + name].tolist())
+                       for name in ('ids', 'types', 'vmax', 'radius', 'relaxation_time', 'route_lengths'))
+        routes = checkpoint['agent_routes'].tolist()
+        self.agents = []
+        for k, agent_id in enumerate(columns['ids']):
+            self.agents.append(Agent(
+                    agent_id = agent_id,
+                    atype = columns['types'][k],
+                    screen = self.screen,
+                    game = self,
+                    agent_image = self.agent_image,
+                    field = self.field_rect,
+                    init_position = (0, 0),
+                    init_direction = (0, 0),
+                    max_speed = columns['vmax'][k],
+                    radius = columns['radius'][k],
+                    relaxation_time = columns['relaxation_time'][k],
+                    waypoints = [waypoints[slot] for slot in routes[k][:columns['route_lengths'][k]]]
+                ))
+        self._agent_count = max(columns['ids']) + 1 if columns['ids'] else 0
+
+        # the kinematic state goes in through a crowd state
+        crowd = CrowdState(self.agents)
+        crowd.update_rows(slice(None), dict((name, checkpoint['agent_' + name])
+                                            for name in CrowdState.MUTABLE_ROWS))
+        crowd.store()
+        self.batch_mode = settings['batch_mode']
+        self.crowd = crowd if self.batch_mode else None
+        self._agents_stale = False
+
+        self.compile_obstacles(*settings['obstacle_compilation'])
+        self.controller.set_state(checkpoint['controller_state'])
+        restore_random_state(checkpoint)
+
+    def crowd_state(self):
+        """ The CrowdState of the current agents (rebuilt when agents
+            were added since it was made)
+        """
+        if self.crowd is None or len(self.crowd) != len(self.agents):
+            self.sync_agents()
+            self.crowd = CrowdState(self.agents)
+        return self.crowd
+
+    def sync_agents(self):
+        """ Copy the batch state back into the Agent entities
+        """
+        if self._agents_stale:
+            self.crowd.store()
+            self._agents_stale = False
+
+    def step(self, dt=None):
+        """ Advance the world by a single simulation step of dt seconds
+        """
+        if dt is None:
+            dt = self.STEP_SIZE
+        started = default_timer()
+        for name in self.step_stats:
+            self.step_stats[name] = 0
+
+        if self.batch_mode:
+            crowd = self.crowd_state()
+            crowd.confine(self.field_rect)
+            if self.domain is not None:
+                self.domain.step(crowd, dt)
+                self.step_stats.update(self.domain.step_stats)
+            else:
+                self.controller.drive_batch(crowd, dt)
+            self._agents_stale = True
+
+            self.sim_time += dt
+            self.step_count += 1
+            self._record()
+            self._observe(started)
+            return
+
+        self.index_agents(dt)
+        if self.agent_verlet is None:
+            for agent in self.agents:
+                agent.update(dt)
+                self.controller.drive_single_step(agent, delta_time=dt)
+        else:
+            for k, agent in enumerate(self.agents):
+                agent.update(dt)
+                self.track_agent(k, agent)
+                self.controller.drive_single_step(agent, delta_time=dt)
+                self.track_agent(k, agent)
+        self._index_margin = None
+
+        self.sim_time += dt
+        self.step_count += 1
+        self._record()
+        self._observe(started)
+
+    def _record(self):
+        if self.writer is not None:
+            self.writer.put(self.recorder.snapshot(self))
+
+    def monitor(self, filename=None, port=None, interval=10.0):
+        """ Keep live metrics of the run in self.metrics (see
+            utils.MetricsRegistry): steps per second, step time
+            quantiles, agents, neighbor counts, obstacle queries and
+            memory in use (of the domain workers too, see
+            use_domain_decomposition).
+
+            filename:
+                write them there in the Prometheus text format, every
+                interval seconds of wall time and when monitoring stops
+            port:
+                also serve them on localhost:port
+        """
+        self.stop_monitoring()
+        metrics = MetricsRegistry()
+        metrics.counter('steps_total', 'Simulation steps taken')
+        metrics.rate('steps_per_second', 'Simulation steps per second of wall time, over the last 100 steps')
+        metrics.summary('step_seconds', 'Wall time of a simulation step, over the last 1000 steps')
+        metrics.gauge('sim_time_seconds', 'Simulated time', lambda: self.sim_time)
+        metrics.gauge('agents', 'Number of agents', lambda: len(self.agents))
+        metrics.gauge('neighbors_mean', 'Mean number of neighbors per agent in the last step')
+        metrics.gauge('neighbors_max', 'Largest number of neighbors of an agent in the last step')
+        metrics.gauge('neighbors_examined', 'Candidate neighbors distance-checked in the last step')
+        metrics.gauge('obstacle_queries', 'Obstacle distance lookups in the last step, one per agent '
+                                          'when compiled, one per agent and obstacle when scanning')
+        metrics.gauge('memory_bytes', 'Resident memory of the process and its domain workers',
+                      self.memory_in_use)
+        self.metrics = metrics
+
+        self._metrics_file = filename
+        self._metrics_interval = interval
+        self._metrics_written = default_timer()
+        if port is not None:
+            metrics.serve(port)
+
+    def memory_in_use(self):
+        """ Resident memory in bytes of the process and of the domain
+            decomposition workers, if any
+        """
+        memory = memory_in_use()
+        if self.domain is not None:
+            memory += sum(self.domain.worker_memory.values())
+        return memory
+
+    def stop_monitoring(self):
+        if self.metrics is None:
+            return
+        if self._metrics_file is not None:
+            self.metrics.write(self._metrics_file)
+        self.metrics.close()
+        self.metrics = None
+
+    def _observe(self, started):
+        if self.metrics is None:
+            return
+        now = default_timer()
+        metrics, stats = self.metrics, self.step_stats
+        metrics['steps_total'].inc()
+        metrics['steps_per_second'].mark(now)
+        metrics['step_seconds'].observe(now - started)
+        agents = len(self.agents)
+        metrics['neighbors_mean'].set(float(stats['neighbors_found']) / agents if agents else 0.0)
+        metrics['neighbors_max'].set(stats['max_neighbors'])
+        metrics['neighbors_examined'].set(stats['neighbors_examined'])
+        metrics['obstacle_queries'].set(stats['obstacle_queries'])
+
+        if self._metrics_file is not None and now - self._metrics_written >= self._metrics_interval:
+            self.metrics.write(self._metrics_file)
+            self._metrics_written = now
+
+    def trace(self, filename):
+        """ Start recording a timeline of the steps, with the counters
+            of trace_counters, written to filename as a Chrome trace by
+            stop_tracing
+        """
+        self.stop_tracing()
+        self.tracer.reset()
+        self.tracer.enable()
+        self._trace_file = filename
+
+    def stop_tracing(self):
+        if self._trace_file is None:
+            return
+        self.tracer.disable()
+        self.tracer.write(self._trace_file)
+        self._trace_file = None
+
+    def trace_counters(self):
+        return dict(agents=len(self.agents),
+                    neighbors_examined=self.step_stats['neighbors_examined'])
+
+    def run(self, n_steps, dt=None):
+        """ Advance the world by n_steps simulation steps
+        """
+        for _ in xrange(n_steps):
+            self.step(dt)
+
+    def compile_obstacles(self, method='field', resolution=None, max_distance=None):
+        """ Compile the obstacles so that obstacle forces no longer scan
+            over every Obstacle entity. The compiled form is kept up to
+            date when obstacles are added; call refit_obstacles() after
+            changing obstacles in place.
+
+            method:
+                'field' rasterizes the obstacles into a DistanceField and
+                forces become a lookup. 'exact' compiles them into an
+                ObstacleGeometry (segment and circle arrays) and 'tree'
+                into an AABBTree, both keeping the exact closest points.
+                None goes back to scanning the obstacles
+            resolution:
+                spacing of the field nodes in metres, defaults to the
+                scene cell size
+            max_distance:
+                distance (metres) up to which the field is computed,
+                defaults to the range of the obstacle force (5 agent
+                radii) plus a couple of nodes
+        """
+        self._obstacle_compilation = method, resolution, max_distance
+        self.obstacle_field = None
+        self.obstacle_geometry = None
+
+        if method is None:
+            return
+        elif method == 'exact':
+            self.obstacle_geometry = ObstacleGeometry(self.obstacles)
+            return
+        elif method == 'tree':
+            self.obstacle_geometry = AABBTree(self.obstacles)
+            return
+        elif method != 'field':
+            raise ValueError('unknown obstacle compilation method: %s' % method)
+
+        if resolution is None:
+            resolution = min(self.GRID_SIZE) / SCALE
+        if max_distance is None:
+            radius = max([agent.radius for agent in self.agents] or [0.3])
+            max_distance = 5 * radius + 2 * resolution
+
+        bounds = (self.field_rect.left / SCALE, self.field_rect.top / SCALE,
+                  self.field_rect.right / SCALE, self.field_rect.bottom / SCALE)
+        self.obstacle_field = DistanceField(self.obstacles, bounds, resolution, max_distance)
+
+    def refit_obstacles(self):
+        """ Bring the compiled obstacles up to date after obstacles were
+            moved or resized in place (the tree is refitted, other forms
+            are compiled again)
+        """
+        if isinstance(self.obstacle_geometry, AABBTree):
+            self.obstacle_geometry.refit(self.obstacles)
+        else:
+            self.compile_obstacles(*self._obstacle_compilation)
+
+    def add_agents(self, agent_dict):
+        for agent in agent_dict:
+            dx, dy = float(agent['dx']), float(agent['dy'])
+            x, y = float(agent['x']), float(agent['y'])
+            num = int(agent['n'])
+            a_type = int(agent['type'])
+
+            # spawn an agent in a random direction and position(within dx, dy)
+            direction = (randint(-1, 1), randint(-1, 1))
+            position = random_position(x, y, dx, dy)
+            # SceneIO gives a route of a single waypoint as the waypoint itself
+            waypoints = [awp['id'] for awp in _as_list(agent.get('addwaypoint'))]
+
+            rd = 0.3
+
+            for _ in xrange(num):
+                self.agents.append(Agent(
+                        agent_id = self._agent_count,
+                        atype = a_type,
+                        screen = self.screen,
+                        game = self,
+                        agent_image = self.agent_image,
+                        field = self.field_rect,
+                        init_position = position,
+                        init_direction = direction,
+                        max_speed = normalvariate(*self.SPEED_DISTRIBUTION),
+                        radius = rd,
+                        waypoints = [self.waypoints[wp] for wp in waypoints]
+                    ))
+                self._agent_count += 1
+
+        # we are done here
+        # TODO - move the velocity stuff to a neat function
+        # TODO - find a suitable fatness distribution
+
+    def add_waypoints(self, waypoint_dict):
+        for waypoint in waypoint_dict:
+            w_id = waypoint['id']
+            radius = float(waypoint['radius'])
+            wtype = waypoint['type']
+            x, y = float(waypoint['x']), float(waypoint['y'])
+            self.waypoints.update({w_id : Waypoint(screen=self.screen, wid=w_id, wtype=wtype, position=(x, y), radius=radius)})
+
+    def add_obstacles(self, obstacle_dict):
+        for obstacle in obstacle_dict:
+            o_id = obstacle['id']
+            p1 = float(obstacle['p1'])
+            p2 = float(obstacle['p2'])
+            p3 = float(obstacle['p3'])
+            p4 = float(obstacle['p4'])
+            o_type = obstacle['type'].title()
+            self.obstacles.append(Obstacle(screen=self.screen, oid=o_id, otype=o_type, params=(p1, p2, p3, p4)))
+
+        # keep the compiled obstacles in sync
+        if isinstance(self.obstacle_geometry, AABBTree):
+            self.obstacle_geometry.rebuild(self.obstacles)
+        elif self._obstacle_compilation[0] is not None:
+            self.compile_obstacles(*self._obstacle_compilation)
+
+
+# phases of a step timed by World.profiler, in sequential (drive_single_step)
+# and in batch mode (drive_batch)
+PROFILE_HOOKS = [
+    ('step', World, 'step'),
+    ('neighbors', World, 'index_agents'),
+    ('drive', SocialForceController, 'drive_single_step'),
+    ('social_move', Agent, 'social_move'),
+    ('neighbors', World, 'get_agent_neighbors'),
+    ('social', Agent, '_compute_social_force'),
+    ('desired', Agent, '_compute_desired_force'),
+    ('obstacle', Agent, '_compute_obstacle_force'),
+    ('lookahead', Agent, '_compute_lookahead_force'),
+    ('drive', SocialForceController, 'drive_batch'),
+    ('neighbors', World, 'agent_neighbor_pairs'),
+    ('social', social_force_controller, 'pairwise_social_forces'),
+    ('desired', social_force_controller, 'advance_waypoints'),
+    ('desired', social_force_controller, 'desired_forces'),
+    ('obstacle', SocialForceController, '_obstacle_forces'),
+]
+
+# phases of the timeline recorded by World.tracer, counters are sampled
+# after every step
+TRACE_HOOKS = [
+    ('step', World, 'step'),
+]